@@ -0,0 +1,68 @@
+import contextlib
+import io
+import os
+import zipfile
+import xml.etree.ElementTree as ElementTree
+
+
+ZIP_MAGIC = b'PK\x03\x04'
+'''the first bytes of every zip file, and so of every compressed .mxl file'''
+
+
+@contextlib.contextmanager
+def OpenMusicXml(source):
+    '''
+    Context manager which opens any kind of MusicXML source as a binary stream the xml parsers can read from.
+    Compressed .mxl files are detected by their zip signature rather than their extension, and their root file
+    (as named by META-INF/container.xml) is streamed straight out of the archive, so nothing is written to disk
+    and the decompressed document is never held in memory as a whole.
+    :param source: a file path, the bytes of a .xml or .mxl file, or a binary file-like object
+    :return: a binary file-like object. Anything opened here is closed when the context exits; file objects
+    passed in by the caller are left open.
+    '''
+    with contextlib.ExitStack() as stack:
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            fob = io.BytesIO(source)
+        elif isinstance(source, (str, os.PathLike)):
+            fob = stack.enter_context(open(source, 'rb'))
+        elif hasattr(source, 'read'):
+            fob = source
+        else:
+            raise TypeError("MusicXML source must be a path, bytes or a file-like object, not " + type(source).__name__)
+        if IsZip(fob):
+            archive = stack.enter_context(zipfile.ZipFile(fob))
+            fob = stack.enter_context(archive.open(RootFile(archive)))
+        yield fob
+
+
+def IsZip(fob):
+    '''
+    Method which checks a stream for the zip signature without consuming it
+    :param fob: a binary file-like object
+    :return: True if the stream is a zip archive. Streams which cannot seek are never treated as zips
+    '''
+    if not (hasattr(fob, 'seekable') and fob.seekable()):
+        return False
+    position = fob.tell()
+    magic = fob.read(len(ZIP_MAGIC))
+    fob.seek(position)
+    return magic == ZIP_MAGIC
+
+
+def RootFile(archive):
+    '''
+    Method which finds the MusicXML document inside a compressed .mxl archive
+    :param archive: an open ZipFile
+    :return: the archive name of the root file listed first in META-INF/container.xml, or, for archives without
+    a container, the first .xml or .musicxml file outside META-INF
+    '''
+    names = archive.namelist()
+    if 'META-INF/container.xml' in names:
+        with archive.open('META-INF/container.xml') as container:
+            for event, elem in ElementTree.iterparse(container):
+                if elem.tag.rpartition('}')[2] == 'rootfile' and elem.get('full-path'):
+                    return elem.get('full-path')
+    for name in names:
+        if not name.startswith('META-INF/') and name.endswith(('.xml', '.musicxml')):
+            return name
+    raise ValueError("compressed MusicXML file has no root file")
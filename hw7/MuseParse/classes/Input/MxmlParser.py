@@ -1,12 +1,19 @@
+import copy
+import cProfile
+import time
+import types
+from fractions import Fraction
 import xml.sax
 from xml.sax import make_parser, handler
-import copy
+from xml.parsers import expat
 
 from ..ObjectHierarchy.ItemClasses import Directions, Key, BarlinesAndMarkers, Clef, Meter, \
     Meta, Harmony, Note, Mark, Ornaments, Part
 from .. import Exceptions
 from ... import helpers
 from ..ObjectHierarchy.TreeClasses import PieceTree
+from . import MxlSource
+from .ParseStats import ParseStats
 
 
 def IdAsInt(index):
@@ -17,21 +24,67 @@ def IdAsInt(index):
             return index
 
 
+class TagStack(list):
+
+    '''
+    The stack of open tags, innermost last. It is a list, so handlers can still read tags[-1] and tags[-2], but it
+    also counts the open tags of each name, so checking whether a tag is open, e.g "note" in tags, takes constant
+    time rather than a search of the stack.
+    '''
+
+    def __init__(self):
+        list.__init__(self)
+        self.counts = {}
+        '''the number of open tags with each name'''
+
+    def append(self, name):
+        list.append(self, name)
+        self.counts[name] = self.counts.get(name, 0) + 1
+
+    def pop(self):
+        name = list.pop(self)
+        if self.counts[name] == 1:
+            del self.counts[name]
+        else:
+            self.counts[name] -= 1
+        return name
+
+    def __contains__(self, name):
+        return name in self.counts
+
+
 class MxmlParser(object):
 
     """
     This class encases a standard XML SAX parser in order to parse MusicXML into a tree of objects. Only one is needed for any parse job
-    and it can be reused for multiple files.
+    and it can be reused for multiple files. Each parse runs in its own parse context (see Context), so one parser can be
+    used by several threads at once.
 
     ## Optional input
 
-    - excluded - a list of tags which the parser should ignore. functionality of this is not currently implemented.
+    - excluded - a list of tags which the parser should ignore. Each excluded tag is skipped along with everything inside it,
+    so no handler ever sees it. presentation_tags lists the tags that only affect how a score looks.
+
+    - parts - a list of part ids to parse. Other parts are skipped, including their score-part entries. Defaults to all parts.
+
+    - bars - a range (or any container) of measure numbers to parse. Only the attributes of other measures are read, so
+    divisions carry over, and the measures are then dropped from the tree. Defaults to all measures.
+
+    - backend - "sax" (the default) to parse through xml.sax, or "expat" to drive pyexpat directly. The expat backend
+    hands the handlers the same tags, attributes and text without SAX's attribute objects and split up text, and is
+    faster. Its errors are xml.parsers.expat.ExpatError rather than xml.sax.SAXParseException.
+
+    - on_measure - a function which is called with the part id, measure id, staff id and MeasureNode of each staff of a
+    measure as soon as the measure's end tag is processed. See also iter_measures.
+
+    - profile - if True each parse counts its events per tag and times each handler function, and the results are
+    left in parser.stats as a ParseStats. Profiling slows the parse down a lot; when it is off it costs nothing.
 
 
     """
 
-    data = {}
-    '''A dictionary holding data which needs to be tracked by the parser, but is specific to each piece'''
+    presentation_tags = ["credit", "defaults", "lyric", "harmony", "direction", "print", "figured-bass"]
+    '''tags which can be excluded when only pitches and durations are needed'''
 
     def clear(self):
         '''
@@ -40,8 +93,12 @@ class MxmlParser(object):
         '''
 
 
-        self.tags = []
-        '''the current list of tags which have been opened in the XML file'''
+        self.tags = TagStack()
+        '''the current stack of tags which have been opened in the XML file'''
+
+
+        self.handlers = []
+        '''the handler in effect for each open tag: its own handler, or else the handler of its parent'''
 
 
         self.chars = {}
@@ -55,12 +112,30 @@ class MxmlParser(object):
         self.handler = None
         ''' the method which will handle the current tag, and the data currently in the class '''
 
+
+        self.skipping = 0
+        '''the depth inside an excluded subtree, or 0 when no subtree is being skipped'''
+
+
+        self.skip_measure = False
+        '''whether the current measure is outside the bars being parsed'''
+
+
+        self.carried_divisions = {}
+        '''divisions of dropped measures, indexed by part id and staff, waiting for the next measure which is kept'''
+
         self.piece = PieceTree.PieceTree()
         '''the class tree top'''
 
         self.isDynamic = False
         '''Indicator of whether the current thing being processed is a dynamic'''
 
+        self.stats = ParseStats() if self.profile else None
+        '''the profile of the parse, or None if the parser isn't profiling'''
+
+        self.data = {}
+        '''A dictionary holding data which needs to be tracked by the parser, but is specific to each piece'''
+
         self.data["note"] = None
         self.data["direction"] = None
         self.data["expression"] = None
@@ -69,15 +144,43 @@ class MxmlParser(object):
         self.data["staff_id"] = 1
         self.data["voice"] = 1
         self.data["handleType"] = ""
+        self.data["divisions"] = 1
+        self.data["duration"] = 0
 
-    def __init__(self, excluded=[]):
+    def __init__(self, excluded=[], parts=None, bars=None, backend="sax", on_measure=None, profile=False):
         # stuff for parsing. Tags refers to the xml tag list, chars refers to the content of each tag,
         # attribs refers to attributes of each tag, and handler is a method we
         # call to work with each tag
 
 
-        self.excluded = excluded
-        '''this will be put in later, but parser can take in tags we want to ignore, e.g clefs, BarlinesAndMarkerss etc.'''
+        self.excluded = set(excluded)
+        '''tags we want to ignore, along with everything inside them, e.g lyrics, directions etc.'''
+
+
+        self.parts = parts
+        '''ids of the parts to parse, or None for all of them'''
+
+
+        self.bars = bars
+        '''numbers of the measures to parse, or None for all of them'''
+
+
+        if backend not in ("sax", "expat"):
+            raise ValueError("backend must be sax or expat, not " + str(backend))
+        self.backend = backend
+        '''the xml parser driving the handlers'''
+
+
+        self.on_measure = on_measure
+        '''the function to call with each completed measure, or None'''
+
+
+        self.profile = profile
+        '''whether each parse makes a ParseStats'''
+
+
+        self.block_size = 65536
+        '''the number of bytes read from the file and fed to the xml parser at a time'''
 
 
         self.structure = {
@@ -111,13 +214,18 @@ class MxmlParser(object):
         '''not sure this is needed anymore, but tags which we shouldn't clear the previous data for should be added here'''
 
 
-        self.closed_tags = ["tie", "chord", "note", "measure", "part",
+        self.closed_tags = {"tie", "chord", "note", "measure", "part",
                             "score-part", "sound", "print", "rest", "slur",
                             "accent", "strong-accent", "staccato",
                             "staccatissimo", "up-bow", "down-bow",
-                            "cue", "key", "clef", "part-group", "metronome"]
+                            "cue", "key", "clef", "part-group", "metronome"}
         '''any tags which close instantly in here'''
 
+
+        self.dispatch = {}
+        '''the handler, whether the tag is closed and whether it is a dynamic, for each pair of parent handler and tag
+        seen so far, so that each pair is only worked out once'''
+
         self.end_tag = ["tremolo"]
         self.clear()
 
@@ -128,20 +236,59 @@ class MxmlParser(object):
         :param attrs: the tag's attributes
         :return: none, side effect of modifying bits of the current class
         '''
-        if name not in self.excluded:
-            if name in self.structure.keys():
-                self.handler = self.structure[name]
+        if self.stats is not None:
+            self.stats.Count(self.stats.starts, name)
+        if self.skipping:
+            self.skipping += 1
+        elif self.Skip(name, attrs):
+            self.skipping = 1
+        else:
+            entry = self.dispatch.get((self.handler, name))
+            if entry is None:
+                entry = self.Dispatch(name)
+            self.handler, closed, self.isDynamic = entry
 
             self.tags.append(name)
+            self.handlers.append(self.handler)
             if attrs is not None:
                 self.attribs[name] = attrs
-            self.isDynamic = CheckDynamics(name)
             if self.isDynamic and "dynamics" in self.tags:
                 self.handler(
                     self.tags, self.attribs, self.chars, self.piece, self.data)
-            if name in self.closed_tags and self.handler is not None:
+            if closed and self.handler is not None:
                 self.handler(
                     self.tags, self.attribs, self.chars, self.piece, self.data)
+            if name == "measure" and self.carried_divisions and not self.skip_measure:
+                self.CarryDivisions()
+
+    def Dispatch(self, name):
+        '''
+        Method which works out how a tag is handled under the current handler, and stores it in the dispatch table
+        :param name: name of the tag
+        :return: tuple of the tag's handler, whether it is a closed tag and whether it is a dynamic
+        '''
+        entry = (self.structure.get(name, self.handler), name in self.closed_tags, CheckDynamics(name))
+        self.dispatch[(self.handler, name)] = entry
+        return entry
+
+    def Skip(self, name, attrs):
+        '''
+        Method which decides whether a tag should be skipped along with everything inside it
+        :param name: name of the tag
+        :param attrs: the tag's attributes
+        :return: True if the tag is excluded, belongs to a part which isn't being parsed, or is inside a measure which
+        isn't being parsed and isn't its attributes
+        '''
+        if name in self.excluded:
+            return True
+        if self.parts is not None and name in ("part", "score-part"):
+            return attrs is None or attrs.get("id") not in self.parts
+        if self.bars is not None:
+            if name == "measure":
+                self.skip_measure = attrs is None or IdAsInt(attrs.get("number")) not in self.bars
+            elif self.skip_measure and self.tags and self.tags[-1] == "measure":
+                return name != "attributes"
+        return False
 
     def validateData(self, text):
         '''
@@ -165,6 +312,10 @@ class MxmlParser(object):
         :param text: the text encountered
         :return: None, has side effects modifying the class itself
         '''
+        if self.stats is not None:
+            self.stats.Count(self.stats.characters, self.tags[-1] if len(self.tags) else "")
+        if self.skipping:
+            return
         sint = ignore_exception(ValueError)(int)
         if len(self.tags) > 0:
             if self.tags[-1] == "beat-type" or self.tags[-1] == "beats":
@@ -178,11 +329,31 @@ class MxmlParser(object):
                 else:
                     self.chars[self.tags[-1]] += text
 
+    def NewText(self, text):
+        '''
+        Method which is called by the expat backend with all the text between two tags at once. SAX splits text at
+        each newline and only keeps pieces which aren't blank, so the same pieces are kept here
+        :param text: the text encountered
+        :return: None, has side effects modifying the class itself
+        '''
+        if self.stats is not None:
+            self.stats.Count(self.stats.characters, self.tags[-1] if len(self.tags) else "")
+        if self.skipping or len(self.tags) == 0:
+            return
+        if "\n" in text:
+            text = "".join(line for line in text.split("\n") if line.strip(" "))
+        if text.strip(" "):
+            name = self.tags[-1]
+            if name in self.chars:
+                self.chars[name] += text
+            else:
+                self.chars[name] = text
+
     def CopyNote(self, part, measure_id, new_note):
         '''
          handles copying the latest note into the measure note list.
          done at end of note loading to make sure staff_id is right as staff id could be encountered
-         any point during the note tag
+         any point during the note tag. The note's duration tag, over the divisions in effect, gives how far it moves the measure on
         :param part: the part class to copy it into
         :param measure_id: the id of the measure in which the note belongs
         :param new_note: the new note class to be copied in
@@ -196,44 +367,57 @@ class MxmlParser(object):
         if voice_obj is None:
             measure.addVoice(id=self.data["voice"])
             voice_obj = measure.getVoice(self.data["voice"])
-        add = True
-        notes = voice_obj.GetChildrenIndexes()
-        for n in notes:
-            no = voice_obj.GetChild(n)
-            if new_note == no:
-                add = False
-                break
-        if add:
-            chord = False
-            if hasattr(new_note, "chord"):
-                chord = new_note.chord
-
-            measure.addNote(new_note, self.data["voice"], chord=chord)
-            if hasattr(new_note, "BarlinesAndMarkersRest") and new_note.BarlinesAndMarkersRest:
-                measure.rest = True
-                voice_obj.rest = True
-
-    def ResetHandler(self, name):
+        chord = False
+        if hasattr(new_note, "chord"):
+            chord = new_note.chord
+
+        length = self.data["duration"] / self.data["divisions"]
+        measure.addNote(new_note, self.data["voice"], chord=chord, length=length)
+        if hasattr(new_note, "BarlinesAndMarkersRest") and new_note.BarlinesAndMarkersRest:
+            measure.rest = True
+            voice_obj.rest = True
+
+    def DropMeasure(self, part_id, part, measure_id):
         '''
-        Method which assigns handler to the tag encountered before the current, or else
-        sets it to None
+        Method which removes a measure that isn't being parsed from every staff of its part, remembering its divisions
+        for the next measure which is kept
+        :param part_id: the id of the part
+        :param part: the part node the measure belongs to
+        :param measure_id: the id of the measure
+        :return: None, side effects modifying the piece tree
+        '''
+        for staff_id in part.GetChildrenIndexes():
+            measure = part.getStaff(staff_id).PopChild(measure_id)
+            if measure is not None and hasattr(measure, "divisions"):
+                self.carried_divisions[(part_id, staff_id)] = measure.divisions
 
-        :param name: name of the latest tag
+    def CarryDivisions(self):
+        '''
+        Method which gives a measure that is being parsed the divisions of the measures dropped before it. This happens
+        when the measure opens, as backups and forwards need the divisions before the measure is finished
+        :return: None, side effects modifying the piece tree
+        '''
+        part_id = helpers.GetID(self.attribs, "part", "id")
+        measure_id = IdAsInt(helpers.GetID(self.attribs, "measure", "number"))
+        part = self.piece.getPart(part_id)
+        if part is None:
+            return
+        for staff_id in part.GetChildrenIndexes():
+            if (part_id, staff_id) in self.carried_divisions:
+                if part.getMeasure(measure_id, staff_id) is None:
+                    part.addEmptyMeasure(measure_id, staff_id)
+                part.getMeasure(measure_id, staff_id).divisions = self.carried_divisions.pop((part_id, staff_id))
+
+    def ResetHandler(self):
+        '''
+        Method which closes the latest tag and assigns the handler in effect for the tag encountered before it,
+        or else sets it to None
 
         :return:
         '''
-        if name in self.tags:
-            if len(self.tags) > 1:
-                key = len(self.tags) - 2
-                self.handler = None
-                while key >= 0:
-                    if self.tags[key] in self.structure:
-                        self.handler = self.structure[self.tags[key]]
-                        break
-                    key -= 1
-
-            else:
-                self.handler = None
+        self.tags.pop()
+        self.handlers.pop()
+        self.handler = self.handlers[-1] if self.handlers else None
 
     def EndTag(self, name):
         '''
@@ -243,18 +427,20 @@ class MxmlParser(object):
 
         :return: None, side effects
         '''
+        if self.stats is not None:
+            self.stats.Count(self.stats.ends, name)
+        if self.skipping:
+            self.skipping -= 1
+            return
         if self.handler is not None and not self.isDynamic and name not in self.closed_tags:
             self.handler(
                 self.tags, self.attribs, self.chars, self.piece, self.data)
 
-        self.ResetHandler(name)
-
-        if name in self.tags:
-            self.tags.remove(name)
+        self.ResetHandler()
 
         if name == "direction":
-            # Copy the direction into the appropriate place, and then clear the
-            # direction cache
+            # Hand the direction over to the appropriate place, and then clear the
+            # direction cache. Nothing else holds the cached object, so it isn't copied
             if self.data["direction"] is not None:
                 measure_id = IdAsInt(
                     helpers.GetID(
@@ -269,11 +455,11 @@ class MxmlParser(object):
                     measure =  part.getMeasure(
                         measure_id, self.data["staff_id"])
                     measure.addDirection(
-                        copy.deepcopy(self.data["direction"]), self.data["voice"])
+                        self.data["direction"], self.data["voice"])
                 self.data["direction"] = None
 
             if self.data["expression"] is not None:
-                # copy the expression into the appropriate place, then clear
+                # hand the expression over to the appropriate place, then clear
                 # the expression cache
                 measure_id = IdAsInt(
                     helpers.GetID(
@@ -288,7 +474,7 @@ class MxmlParser(object):
                     measure =  part.getMeasure(
                         measure_id, self.data["staff_id"])
                     measure.addExpression(
-                        copy.deepcopy(self.data["expression"]), self.data["voice"])
+                        self.data["expression"], self.data["voice"])
                 self.data["expression"] = None
 
         if name == "part":
@@ -327,6 +513,13 @@ class MxmlParser(object):
 
             measure =  part.getMeasure(measure_id, self.data["staff_id"])
             measure.RunVoiceChecks()
+            if self.skip_measure:
+                self.DropMeasure(part_id, part, measure_id)
+            elif self.on_measure is not None:
+                for staff_id in part.GetChildrenIndexes():
+                    staff_measure = part.getMeasure(measure_id, staff_id)
+                    if staff_measure is not None:
+                        self.on_measure(part_id, measure_id, staff_id, staff_measure)
             self.data["staff_id"] = 1
             self.data["voice"] = 1
 
@@ -337,7 +530,8 @@ class MxmlParser(object):
             self.chars.pop(name)
 
         if name == "note":
-            # copy accross the new note and then clear the cache
+            # hand the new note over to the measure and then clear the cache, so the
+            # piece tree owns the note object rather than a copy of it
             measure_id = IdAsInt(
                 helpers.GetID(
                     self.attribs,
@@ -349,8 +543,9 @@ class MxmlParser(object):
                 part = self.piece.getLastPart()
             if part is not None:
                 self.CopyNote(
-                    part, measure_id, copy.deepcopy(self.data["note"]))
+                    part, measure_id, self.data["note"])
             self.data["note"] = None
+            self.data["duration"] = 0
 
         if name == "degree":
             self.data["degree"] = None
@@ -360,11 +555,121 @@ class MxmlParser(object):
     def parse(self, file):
         '''
         Method the programmer should call when ready to parse a file.
-        :param file: exact file path of the file to be processed
+        :param file: exact file path of the file to be processed, the bytes of a file, or a binary file-like object.
+        Compressed .mxl files are read straight out of the archive, see MxlSource.OpenMusicXml
         :return: PieceTree object representing the file in memory
         '''
+        context = self.Context()
+        context.Run(file)
+        self.piece = context.piece
+        self.stats = context.stats
+        return context.piece
+
+    def iter_measures(self, file):
+        '''
+        Method which parses a file incrementally, yielding each measure as soon as its end tag has been processed, so
+        that work on the first measures can start before the rest of the file is read. Closing the generator early
+        stops the parse and closes the file
+        :param file: the file to be processed, as for parse
+        :return: generator of (part id, measure id, staff id, MeasureNode) tuples, one for each staff of each measure,
+        in file order. Measures are as they stand at their end tag: checks made at the end of a part, such as barline
+        checks, haven't run yet
+        '''
+        context = self.Context()
+        measures = []
+        context.on_measure = lambda *measure: measures.append(measure)
+        for _ in context.Feed(file):
+            for measure in measures:
+                yield measure
+            del measures[:]
+
+    def parse_many(self, files):
+        '''
+        Method which parses several files one after another with the same options. Each file gets a new parse context,
+        and is closed before the next one is opened, even when the caller stops early
+        :param files: an iterable of files, each as for parse
+        :return: generator of PieceTree objects, one for each file in order
+        '''
+        for file in files:
+            yield self.parse(file)
+
+    def Context(self):
+        '''
+        Method which makes the parse context for a single parse: a shallow copy of this parser which shares its options,
+        structure and dispatch table but has its own tags, chars, data and piece tree, so that parses running at the same
+        time never see each other's state
+        :return: MxmlParser holding the fresh state
+        '''
+        context = copy.copy(self)
+        context.clear()
+        return context
+
+    def Run(self, file):
+        '''
+        Method which parses a file using this object's own state. Call parse instead, which runs each file in a new
+        context
+        :param file: the file to be processed, as for parse
+        :return: PieceTree object representing the file in memory
+        '''
+        for _ in self.Feed(file):
+            pass
+        return self.piece
+
+    def Feed(self, file):
+        '''
+        Method which feeds a file to the xml parser one block at a time, pausing after each block so that the caller
+        can act on the measures completed so far, or stop early
+        :param file: the file to be processed, as for parse
+        :return: generator which yields None after each block. The file is closed when the generator finishes or is
+        closed
+        '''
+        profile = cProfile.Profile() if self.stats is not None else None
+        with MxlSource.OpenMusicXml(file) as fob:
+            if self.backend == "expat":
+                parser = self.ExpatParser()
+                feed = parser.Parse
+                finish = lambda block: parser.Parse(block, True)
+            else:
+                parser = self.SaxParser()
+                feed = parser.feed
+                finish = lambda block: parser.close()
+            try:
+                block = fob.read(self.block_size)
+                while block:
+                    self.FeedBlock(feed, block, profile)
+                    yield
+                    block = fob.read(self.block_size)
+                self.FeedBlock(finish, b"", profile)
+                yield
+            finally:
+                if profile is not None:
+                    self.stats.AddProfile(profile, HandlerNames())
+
+    def FeedBlock(self, feed, block, profile):
+        '''
+        Method which feeds one block of the file to the xml parser, with the profiler running if there is one
+        :param feed: the xml parser's feed method
+        :param block: the bytes to feed
+        :param profile: a cProfile.Profile, or None
+        :return: None
+        '''
+        if profile is None:
+            feed(block)
+            return
+        start = time.perf_counter()
+        profile.enable()
+        try:
+            feed(block)
+        finally:
+            profile.disable()
+            self.stats.time += time.perf_counter() - start
+
+    def SaxParser(self):
+        '''
+        Method which makes an incremental xml.sax parser which passes its events to this object
+        :return: the SAX parser
+        '''
         parser = make_parser()
-        self.clear()
 
         class Extractor(xml.sax.ContentHandler):
 
@@ -386,9 +691,35 @@ class MxmlParser(object):
         parser.setContentHandler(Extractor(self))
         # OFFLINE MODE
         parser.setFeature(handler.feature_external_ges, False)
-        fob = open(file, 'r')
-        parser.parse(fob)
-        return self.piece
+        return parser
+
+    def ExpatParser(self):
+        '''
+        Method which makes a pyexpat parser which passes its events to this object directly. Text is buffered, so each
+        run of text arrives in one call, and attributes arrive as a flat list which becomes the attribute dictionary
+        in one step
+        :return: the expat parser
+        '''
+        parser = expat.ParserCreate()
+        parser.buffer_text = True
+        parser.buffer_size = self.block_size
+        parser.ordered_attributes = True
+        parser.StartElementHandler = lambda name, attrs: self.StartTag(name, dict(zip(attrs[::2], attrs[1::2])))
+        parser.EndElementHandler = self.EndTag
+        parser.CharacterDataHandler = self.NewText
+        return parser
+
+
+def HandlerNames():
+    '''
+    Method which lists the handler functions of this module, i.e the functions taking tags, attributes, chars, piece
+    and data
+    :return: set of (file name, first line, function name) tuples, as cProfile names functions
+    '''
+    return set((function.__code__.co_filename, function.__code__.co_firstlineno, function.__name__)
+               for function in globals().values()
+               if isinstance(function, types.FunctionType) and function.__module__ == __name__
+               and function.__code__.co_argcount == 5)
 
 
 def YesNoToBool(entry):
@@ -661,11 +992,11 @@ def HandleMovementBetweenDurations(tags, attrs, chars, piece, data):
                 part.addEmptyMeasure(measure_id, data["staff_id"])
             measure =  part.getMeasure(measure_id, data["staff_id"])
             if "backup" in tags and tags[-1] == "duration":
-                part.CheckDivisions()
-                part.Backup(measure_id, duration=float(chars["duration"]))
+                duration = Fraction(chars["duration"]) / data["divisions"]
+                part.Backup(measure_id, duration=duration)
             if "forward" in tags and tags[-1] == "duration":
-                part.CheckDivisions()
-                part.Forward(measure_id, duration=float(chars["duration"]))
+                duration = Fraction(chars["duration"]) / data["divisions"]
+                part.Forward(measure_id, duration=duration)
 
 
 def HandleFermata(tags, attrs, chars, piece, data):
@@ -751,8 +1082,10 @@ def HandleMeasures(tag, attrib, content, piece, data):
         implicit = helpers.GetID(attrib, "measure", "implicit")
         if implicit is not None:
             measure.partial = YesNoToBool(implicit)
-        if tag[-1] == "divisions" and measure is not None:
-            measure.divisions = int(content["divisions"])
+        if tag[-1] == "divisions":
+            data["divisions"] = int(content["divisions"])
+            if measure is not None:
+                measure.divisions = data["divisions"]
         if tag[-1] == "key":
             if "key" in attrib:
                 if "number" in attrib["key"]:
@@ -1156,6 +1489,7 @@ def CreateNote(tag, attrs, content, piece, data):
                     slash = YesNoToBool(attrs["grace"]["slash"])
             data["note"].addNotation(Note.GraceNote(slash=slash, first=True))
         if tag[-1] == "duration" and "note" in tag:
+            data["duration"] = Fraction(content["duration"])
             if not hasattr(data["note"], "duration"):
                 data["note"].duration = float(content["duration"])
 
@@ -1388,7 +1722,7 @@ def HandleDirections(tags, attrs, chars, piece, data):
             if data["direction"] is not None:
                 if type(data["direction"]) != Directions.Metronome:
                     new_obj = Directions.Metronome(
-                        text=copy.deepcopy(data["direction"]))
+                        text=data["direction"])
                     data["direction"] = new_obj
         if "metronome" in tags:
             if tags[-1] == "beat-unit":
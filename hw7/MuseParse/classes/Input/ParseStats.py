@@ -0,0 +1,68 @@
+import copy
+
+
+class ParseStats(object):
+
+    """
+    The profile of one parse, made when a parser is created with MxmlParser(profile=True) and found in parser.stats
+    after parse. It shows which MusicXML constructs a file is made of and where the parse spent its time.
+
+    - starts, ends, characters - the number of start tag, end tag and text events for each tag name. Text is counted
+    against the innermost open tag.
+
+    - handler_time, handler_calls - the cumulative wall time in seconds, and the number of calls, of each handler
+    function. Cumulative times include the handlers a handler calls, e.g HandleMeasures includes HandleDirections.
+
+    - deepcopies - the number of copy.deepcopy calls made while parsing, not counting the recursive calls inside them.
+
+    - time - the wall time of the whole parse in seconds, with the profiler running.
+    """
+
+    def __init__(self):
+        self.starts = {}
+        self.ends = {}
+        self.characters = {}
+        self.handler_time = {}
+        self.handler_calls = {}
+        self.deepcopies = 0
+        self.time = 0.0
+
+    def Count(self, events, name):
+        '''
+        Method which counts one event
+        :param events: the dictionary of counts the event belongs in, e.g self.starts
+        :param name: the tag name
+        :return: None
+        '''
+        events[name] = events.get(name, 0) + 1
+
+    def AddProfile(self, profile, handlers):
+        '''
+        Method which takes the handler times and deepcopy counts out of a cProfile profile of the parse
+        :param profile: the disabled cProfile.Profile
+        :param handlers: the (file name, first line, function name) of each handler function, as cProfile names them
+        :return: None
+        '''
+        profile.create_stats()
+        for function, (primitive, calls, own, cumulative, callers) in profile.stats.items():
+            filename, line, name = function
+            if function in handlers:
+                self.handler_time[name] = self.handler_time.get(name, 0.0) + cumulative
+                self.handler_calls[name] = self.handler_calls.get(name, 0) + calls
+            elif name == "deepcopy" and filename == copy.__file__:
+                self.deepcopies += primitive
+
+    def Summary(self, limit=10):
+        '''
+        Method which formats the slowest handlers and the most common tags as a table
+        :param limit: the number of handlers and tags to list
+        :return: string of the table
+        '''
+        lines = ["parse: " + format(self.time, ".3f") + "s, " + str(sum(self.starts.values())) + " tags, "
+                 + str(self.deepcopies) + " deepcopies"]
+        for name in sorted(self.handler_time, key=self.handler_time.get, reverse=True)[:limit]:
+            lines.append("  " + format(name, "32") + format(self.handler_time[name], "8.3f") + "s "
+                         + format(self.handler_calls[name], "9") + " calls")
+        for name in sorted(self.starts, key=self.starts.get, reverse=True)[:limit]:
+            lines.append("  <" + format(name + ">", "31") + format(self.starts[name], "9") + " tags")
+        return "\n".join(lines)
@@ -10,6 +10,16 @@ class CannotFindInTreeException(BaseException):
     '''error! can't find element'''
 
 
+CHECK_INDEX = False
+'''set to True to check the result of every Search and BackwardSearch against a full walk of the subtree, and
+the class counts of the subtree against its nodes. Slow, so only meant for tests'''
+
+
+class IndexMismatchException(BaseException):
+
+    '''error! a node's class counts don't match its subtree'''
+
+
 def BackwardSearch(cls_type, node, index, depth=0, start_index=0):
     '''
     Helper method which backwards-recursively searches for objects
@@ -20,36 +30,7 @@ def BackwardSearch(cls_type, node, index, depth=0, start_index=0):
     :param start_index: index to start with in children
     :return: object <index> of <cls_type>
     '''
-    counter = depth
-    if isinstance(node, cls_type):
-        counter += 1
-        if counter == index:
-            return node
-    if node is None:
-        return None
-    else:
-        children = node.GetChildrenIndexes()
-        if len(children) == 0 and isinstance(node, cls_type):
-            return counter
-        else:
-            children.reverse()
-            for child in children:
-                result = Search(
-                    cls_type,
-                    node.GetChild(child),
-                    index,
-                    depth=counter)
-                if isinstance(result, int):
-                    counter = result
-                    if counter == index:
-                        return node.GetChild(child)
-                if isinstance(result, cls_type):
-                    return result
-            if isinstance(node, cls_type):
-                if counter == index:
-                    return node
-                else:
-                    return counter
+    return CheckedSearch(cls_type, node, index, depth, backward=True)
 
 
 def Search(cls_type, node, index, depth=0, start_index=0):
@@ -63,6 +44,39 @@ def Search(cls_type, node, index, depth=0, start_index=0):
     :param start_index: index to start with in children
     :return: object <index> of <cls_type>
     '''
+    return CheckedSearch(cls_type, node, index, depth)
+
+
+def CheckedSearch(cls_type, node, index, depth=0, backward=False):
+    '''
+    Method which runs an indexed search and, when CHECK_INDEX is set, checks it against a full walk of the subtree
+    :param backward: whether to search the children of <node> last to first
+    :return: object <index> of <cls_type>
+    '''
+    result = SubtreeSearch(cls_type, node, index, depth, backward)
+    if CHECK_INDEX:
+        if node is not None:
+            CheckIndex(node)
+        expected = SubtreeSearch(cls_type, node, index, depth, backward, walk=True)
+        if result is not expected and result != expected:
+            raise IndexMismatchException
+    return result
+
+
+def SubtreeSearch(cls_type, node, index, depth=0, backward=False, walk=False, kinds=None):
+    '''
+    Method which does the counting for Search and BackwardSearch. A child whose subtree holds fewer <cls_type>
+    nodes than are left to count can't hold the one searched for, so it is skipped using its class_counts: its
+    nodes are added to the count if the child is a <cls_type> itself, as walking it would, and left out otherwise.
+    Only the children on the way down to the result are searched, so a search visits depth times fanout nodes.
+    Counting a skipped child's nodes assumes each <cls_type> below it hangs from a <cls_type> parent, as in every
+    tree the parser builds; CHECK_INDEX compares each search against a full walk.
+    Only the children of <node> itself are reversed when searching backward: each child is searched forwards.
+    :param walk: set to walk every subtree regardless of the class counts, used to check the index
+    :param kinds: the classes counted below the node the search started at which are <cls_type>, found once per
+    search so that counting a subtree is a few dictionary lookups
+    :return: object <index> of <cls_type>, or the count so far when it's not in this subtree
+    '''
     counter = depth
     if isinstance(node, cls_type):
         counter += 1
@@ -70,28 +84,88 @@ def Search(cls_type, node, index, depth=0, start_index=0):
             return node
     if node is None:
         return None
-    else:
-        children = node.GetChildrenIndexes()
-        if len(children) == 0 and isinstance(node, cls_type):
-            return counter
+    if kinds is None:
+        kinds = MatchingKinds(cls_type, node)
+    if not walk and CountInstances(kinds, node) == 0:
+        return None
+    children = node.GetChildrenIndexes()
+    if len(children) == 0 and isinstance(node, cls_type):
+        return counter
+    if backward:
+        children.reverse()
+    for child in children:
+        if not walk:
+            count = CountInstances(kinds, node.GetChild(child))
+            if count is not None and count < index - counter:
+                if isinstance(node.GetChild(child), cls_type):
+                    counter += count
+                continue
+        result = SubtreeSearch(
+            cls_type,
+            node.GetChild(child),
+            index,
+            depth=counter,
+            walk=walk,
+            kinds=kinds)
+        if isinstance(result, int):
+            counter = result
+            if counter == index:
+                return node.GetChild(child)
+        if isinstance(result, cls_type):
+            return result
+    if isinstance(node, cls_type):
+        if counter == index:
+            return node
         else:
-            for child in children:
-                result = Search(
-                    cls_type,
-                    node.GetChild(child),
-                    index,
-                    depth=counter)
-                if isinstance(result, int):
-                    counter = result
-                    if counter == index:
-                        return node.GetChild(child)
-                if isinstance(result, cls_type):
-                    return result
-            if isinstance(node, cls_type):
-                if counter == index:
-                    return node
-                else:
-                    return counter
+            return counter
+
+
+def MatchingKinds(cls_type, node):
+    '''
+    Method which lists the classes counted in a subtree that are <cls_type> or one of its subclasses. A node's
+    class_counts hold every class below it, so the list serves for every subtree below <node> as well
+    :param cls_type: class type to match
+    :param node: the node at the top of the subtree
+    :return: list of classes, or None if <node> doesn't keep class counts
+    '''
+    counts = getattr(node, "class_counts", None)
+    if counts is None:
+        return None
+    return [kind for kind in counts if issubclass(kind, cls_type)]
+
+
+def CountInstances(kinds, node):
+    '''
+    Method which counts the nodes of some classes in a subtree without walking it
+    :param kinds: list of the classes to count, as given by MatchingKinds
+    :param node: the node at the top of the subtree
+    :return: number of nodes of <kinds>, or None if <node> doesn't keep class counts
+    '''
+    counts = getattr(node, "class_counts", None)
+    if counts is None or kinds is None:
+        return None
+    return sum(counts.get(kind, 0) for kind in kinds)
+
+
+def CheckIndex(node):
+    '''
+    Method which recounts the classes of every node in a subtree and raises IndexMismatchException if any node's
+    class_counts, or any child's parent, is wrong
+    :param node: the node at the top of the subtree
+    :return: the class counts of the subtree
+    '''
+    counts = {type(node): 1}
+    for key in node.GetChildrenIndexes():
+        child = node.GetChild(key)
+        if not isinstance(child, Node):
+            continue
+        if child.parent is not node:
+            raise IndexMismatchException
+        for kind, count in CheckIndex(child).items():
+            counts[kind] = counts.get(kind, 0) + count
+    if counts != node.class_counts:
+        raise IndexMismatchException
+    return counts
 
 
 def FindByIndex(node, index):
@@ -211,6 +285,12 @@ class Node(object):
             '''list of types of nodes which are accepted as child nodes'''
         else:
             self.rules = []
+        self.parent = None
+        '''the node this node is a child of, kept by AddChild and PopChild'''
+
+        self.class_counts = {type(self): 1}
+        '''number of nodes of each class in the subtree starting at this node, itself included. Search and
+        BackwardSearch use it to skip subtrees with nothing to find'''
 
     def PopAllChildren(self):
         '''
@@ -251,7 +331,9 @@ class Node(object):
             node = self.GetChild(key)
             children = node.GetChildrenIndexes()
             child_nodes = [(i, node.GetChild(i)) for i in children]
+            self.Detach(node)
             self.children[key] = item
+            self.Attach(item)
             [self.children[key].AddChild(kid[1], kid[0])
              for kid in child_nodes]
 
@@ -274,10 +356,57 @@ class Node(object):
         this allows us to ducktype between this and IndexedNode """
 
         self.children.append(item)
+        self.Attach(item)
 
     def PopChild(self, key):
         if key < len(self.children):
-            return self.children.pop(key)
+            child = self.children.pop(key)
+            self.Detach(child)
+            return child
+
+    def Attach(self, child):
+        '''
+        Method which links a new child to this node and adds its class counts to this node and its ancestors
+
+        :param child: the child just added
+
+        :return:
+        '''
+        if isinstance(child, Node):
+            child.parent = self
+            self.UpdateCounts(child.class_counts, 1)
+
+    def Detach(self, child):
+        '''
+        Method which unlinks a removed child and takes its class counts off this node and its ancestors
+
+        :param child: the child just removed
+
+        :return:
+        '''
+        if isinstance(child, Node):
+            child.parent = None
+            self.UpdateCounts(child.class_counts, -1)
+
+    def UpdateCounts(self, counts, sign):
+        '''
+        Method which adds (or with a sign of -1, takes away) class counts to this node and all its ancestors
+
+        :param counts: dictionary of class to number of nodes
+
+        :param sign: 1 or -1
+
+        :return:
+        '''
+        node = self
+        while node is not None:
+            for kind, count in counts.items():
+                total = node.class_counts.get(kind, 0) + sign * count
+                if total == 0:
+                    del node.class_counts[kind]
+                else:
+                    node.class_counts[kind] = total
+            node = node.parent
 
     def AddRule(self, rule):
         self.rules.append(rule)
@@ -312,7 +441,9 @@ class IndexedNode(Node):
 
     def PopChild(self, key):
         if key in self.children:
-            return self.children.pop(key)
+            child = self.children.pop(key)
+            self.Detach(child)
+            return child
 
     def GetChildrenIndexes(self):
         return list(self.children.keys())
@@ -324,7 +455,10 @@ class IndexedNode(Node):
     def AddChild(self, item, index=-1):
         if index == -1:
             index = len(self.children) - 1
+        if index in self.children:
+            self.Detach(self.children[index])
         self.children[index] = item
+        self.Attach(item)
 
 
 class Tree(object):
@@ -34,14 +34,14 @@ class MeasureNode(IndexedNode):
 
     def __init__(self, **kwargs):
         IndexedNode.__init__(self, rules=[VoiceNode])
-        self.index = 0
+        self.offset = 0
+        '''the position reached in the measure, in quarter notes. Notes are added here, and backups and forwards move it'''
         self.barlines = {}
         self.items = []
         self.autoBeam = False
         if "partial" in kwargs:
             if kwargs["partial"] is not None:
                 self.partial = kwargs["partial"]
-        self.gap = 0
 
     def addWrapper(self, item):
         # method to add any notation that needs to wrap the whole bar
@@ -187,8 +187,7 @@ class MeasureNode(IndexedNode):
             node = KeyNode()
             node.SetItem(item)
             if voice_obj is not None:
-                voice_obj.AddChild(node)
-                self.index += 1
+                voice_obj.InsertChild(self.offset, node)
 
     def GetLastClef(self, voice=1):
         if self.GetChild(voice) is None:
@@ -217,8 +216,7 @@ class MeasureNode(IndexedNode):
             node = ClefNode()
             node.SetItem(item)
             if voice_obj is not None:
-                voice_obj.AddChild(node)
-                self.index += 1
+                voice_obj.InsertChild(self.offset, node)
 
     def CheckDivisions(self):
         children = self.GetChildrenIndexes()
@@ -234,88 +232,45 @@ class MeasureNode(IndexedNode):
 
     def Forward(self, duration=0):
         '''
-        method to use when forward tag is encountered in musicXML. jumps forward in the bar by <duration>
-        :param duration: number of beats to move forward
+        method to use when forward tag is encountered in musicXML. jumps forward in the bar by <duration>. Any voice
+        which gets a note after the jump has the gap filled with rests
+        :param duration: number of quarter notes to move forward
         :return:
         '''
-        for voice in self.GetChildrenIndexes():
-            voice_obj = self.getVoice(voice)
-            if voice_obj.GetChild(self.index) is None:
-                voice_obj.AddChild(NoteNode.NoteNode(duration=duration))
-        self.index += 1
+        self.offset += duration
 
     def Backup(self, duration=0):
         '''
         method to use when a backup tag is encountered in musicXML. Moves back in the bar by <duration>
-        :param duration:
+        :param duration: number of quarter notes to move back
         :return:
         '''
-        total = 0
-        duration_total = duration * 4
-        children = self.GetChildrenIndexes()
-        notes = 0
-        for voice in children:
-            v = self.GetChild(voice)
-            indexes = v.GetChildrenIndexes()
-            if len(indexes) > 1:
-                indexes.reverse()
-            for index in indexes:
-                notes += 1
-                note = v.GetChild(index)
-                if hasattr(note, "duration"):
-                    total += note.duration
-                    if total >= duration_total:
-                        break
-            gap = [
-                v.GetChild(i).duration for i in range(
-                    0,
-                    self.index -
-                    notes) if hasattr(
-                    v.GetChild(i),
-                    "duration")]
-            previous = 0
-            for item in gap:
-                if item == previous:
-                    self.gap -= previous
-                    item = item / 2
-                self.gap += item
-                previous = item
-            #self.gap = sum([])
-        self.index -= notes
+        self.offset = max(0, self.offset - duration)
 
     def addVoice(self, item=None, id=1):
         if item is None:
             item = VoiceNode()
         self.AddChild(item, id)
-        if self.gap != 0:
-            voice = self.GetChild(id)
-            voice.AddChild(NoteNode.Placeholder(duration=self.gap))
-            self.gap = 0
 
     def getVoice(self, key):
         return self.GetChild(key)
 
-    def PositionChild(self, item, key, voice=1):
-        voice_obj = self.getVoice(voice)
-        children = voice_obj.GetChildrenIndexes()
-        if key in children:
-            start_index = key
-            end_index = len(children)
-            popped = []
-            for index in range(start_index, end_index):
-                child = voice_obj.PopChild(index)
-                if child is not None:
-                    popped.append(child)
-            voice_obj.AddChild(item)
-            [voice_obj.AddChild(p) for p in popped]
-
-    def addNote(self, item, voice=1, increment=1, chord=False):
+    def addNote(self, item, voice=1, increment=1, chord=False, length=0):
+        '''
+        method to use when adding a note. The note goes in at the current offset, after anything else starting there,
+        and the offset then moves on by <length>
+        :param item: the note, or a node already wrapping it
+        :param voice: the voice to add it to
+        :param chord: whether the note belongs to the chord of the note before it
+        :param length: how long the note lasts in quarter notes. Chord notes and placeholders don't move the offset
+        :return:
+        '''
         shift = 0
         # get the appropriate voice
         if self.getVoice(voice) is None:
             self.addVoice(VoiceNode(), voice)
         voice_obj = self.getVoice(voice)
-        last = voice_obj.GetChild(self.index - 1)
+        last = voice_obj.last_note
         if last is not None and hasattr(last, "shift"):
             shift = True
         # set up a basic duration: this val will only be used for a placeholder
@@ -345,75 +300,46 @@ class MeasureNode(IndexedNode):
                     voice_obj.addNoteDuration(0.25)
                 if duration == "\\breve":
                     voice_obj.addNoteDuration(0.5)
-            # get whatever is at the current index
-            placeholder = voice_obj.GetChild(self.index)
+            # get whatever note starts at the current offset
+            index = voice_obj.GetNoteIndexAt(self.offset)
+            placeholder = voice_obj.GetChild(index) if index is not None else None
             if isinstance(
                     placeholder,
                     NoteNode.Placeholder) and not isinstance(
                     node,
-                    NoteNode.Placeholder):
+                    NoteNode.Placeholder) and placeholder.duration == 0:
                 # if it's an empty placeholder, replace it with a note
-                if placeholder.duration == 0:
-                    if hasattr(placeholder, "shift"):
-                        children = placeholder.GetChildrenIndexes()
-                        # this will need some recursion if we have multiple directions attached to a placeholder,
-                        # but for now this should work.
-                        for c in children:
-                            child = placeholder.GetChild(c)
-                            if child.GetItem(
-                            ).__class__.__name__ == OctaveShift.__name__:
-                                i = placeholder.PopChild(c)
-                                voice_obj.ReplaceChild(
-                                    self.index,
-                                    copy.deepcopy(i))
-                                self.index += 1
-                    if voice_obj.GetChild(self.index) == placeholder:
-                        voice_obj.ReplaceChild(self.index, node)
-                    elif voice_obj.GetChild(self.index) is not None:
-                        self.PositionChild(node, self.index, voice=voice)
-                    else:
-                        voice_obj.AddChild(node, self.index)
-                    if not isinstance(node, NoteNode.Placeholder):
-                        self.index += 1
-
-            # nothing there? add our note
-            elif placeholder is None:
-                voice_obj.AddChild(node)
-                if not isinstance(node, NoteNode.Placeholder):
-                    self.index += 1
-            else:
-                proposed_node = voice_obj.GetChild(self.index)
-                new_duration = voice_obj.GetChild(self.index).duration
-                if proposed_node.GetItem() is None:
-                    if hasattr(item, "duration"):
-                        new_duration = item.duration
-                    if new_duration == proposed_node.duration:
-                        node.SetItem(node.GetItem())
-                        voice_obj.removeNoteDuration(proposed_node.duration)
-                        voice_obj.ReplaceChild(self.index, node)
-                    elif new_duration > proposed_node.duration:
-                        proposed_node.SetItem(node.GetItem())
-                        proposed_node.duration = new_duration
-                        voice_obj.removeNoteDuration(proposed_node.duration)
-                    elif new_duration < proposed_node.duration:
-                        voice_obj.removeNoteDuration(proposed_node.duration)
-                        voice_obj.removeNoteDuration(new_duration)
-                        proposed_node.duration -= new_duration
-                        voice_obj.addNoteDuration(proposed_node.duration)
-                        voice_obj.addNoteDuration(new_duration)
-                        voice_obj.AddChild(node)
-                        if not isinstance(node, NoteNode.Placeholder):
-                            self.index += 1
+                if hasattr(placeholder, "shift"):
+                    children = placeholder.GetChildrenIndexes()
+                    # this will need some recursion if we have multiple directions attached to a placeholder,
+                    # but for now this should work.
+                    for c in children:
+                        child = placeholder.GetChild(c)
+                        if child.GetItem(
+                        ).__class__.__name__ == OctaveShift.__name__:
+                            i = placeholder.PopChild(c)
+                            voice_obj.ReplaceChild(
+                                index,
+                                copy.deepcopy(i))
+                            index += 1
+                if voice_obj.GetChild(index) == placeholder:
+                    voice_obj.ReplaceChild(index, node, length)
                 else:
-                    self.PositionChild(node, self.index, voice=voice)
+                    voice_obj.InsertChild(self.offset, node, length)
+            else:
+                # nothing there, or a note already there: add ours after it
+                voice_obj.InsertChild(self.offset, node, length)
+            if not isinstance(node, NoteNode.Placeholder):
+                voice_obj.last_note = node
+                self.offset += length
 
         else:
-            # get whatever is at the current index
-            placeholder = voice_obj.GetChild(self.index - 1)
-            if placeholder.GetItem() is not None:
-                if hasattr(placeholder.GetItem(), "beams"):
-                    node.GetItem().beams = placeholder.GetItem().beams
+            # attach it to the note it's a chord with
+            placeholder = voice_obj.last_note
             if placeholder is not None:
+                if placeholder.GetItem() is not None:
+                    if hasattr(placeholder.GetItem(), "beams"):
+                        node.GetItem().beams = placeholder.GetItem().beams
                 placeholder.AttachNote(node)
 
     def getPartialLength(self):
@@ -461,11 +387,10 @@ class MeasureNode(IndexedNode):
         if self.getVoice(voice) is None:
             self.addVoice(VoiceNode(), voice)
         voice_obj = self.getVoice(voice)
-        children = voice_obj.GetChildrenIndexes()
-        if self.index >= len(children):
+        if self.offset >= voice_obj.end:
             self.addNote(holder, voice)
         else:
-            self.PositionChild(holder, self.index, voice=voice)
+            voice_obj.InsertChild(self.offset, holder)
         return None
 
     def addDirection(self, item, voice=1):
@@ -493,18 +418,7 @@ class MeasureNode(IndexedNode):
         direction_obj = DirectionNode()
         direction_obj.SetItem(item)
         voice_obj = self.getVoice(voice)
-        if self.index == 0:
-            finder = 0
-        else:
-            if item.__class__.__name__ == Directions.Pedal.__name__:
-                note = voice_obj.GetChild(self.index - 1)
-                if note is not None:
-                    result = note.Find(DirectionNode, Directions.Pedal)
-                    if result is not None:
-                        self.index += 1
-            finder = self.index
-
-        note_obj = voice_obj.GetChild(finder)
+        note_obj = voice_obj.GetNoteAt(self.offset)
         if isinstance(
                 note_obj,
                 NoteNode.NoteNode) or isinstance(
@@ -512,10 +426,8 @@ class MeasureNode(IndexedNode):
                 NoteNode.Placeholder):
             note_obj.AttachDirection(direction_obj)
         else:
-            self.addPlaceholder()
-            if self.index >= len(voice_obj.children):
-                self.index = len(voice_obj.children) - 1
-            note_obj = voice_obj.GetChild(self.index)
+            self.addPlaceholder(voice=voice)
+            note_obj = voice_obj.GetNoteAt(self.offset)
             if isinstance(note_obj, NoteNode.Placeholder):
                 note_obj.AttachDirection(direction_obj)
 
@@ -525,7 +437,7 @@ class MeasureNode(IndexedNode):
         direction_obj = ExpressionNode()
         direction_obj.SetItem(item)
         voice_obj = self.getVoice(voice)
-        note_obj = voice_obj.GetChild(self.index)
+        note_obj = voice_obj.GetNoteAt(self.offset)
         if isinstance(
                 note_obj,
                 NoteNode.NoteNode) or isinstance(
@@ -533,8 +445,8 @@ class MeasureNode(IndexedNode):
                 NoteNode.Placeholder):
             note_obj.AttachExpression(direction_obj)
         else:
-            self.addPlaceholder()
-            note_obj = voice_obj.GetChild(self.index)
+            self.addPlaceholder(voice=voice)
+            note_obj = voice_obj.GetNoteAt(self.offset)
             if isinstance(note_obj, NoteNode.Placeholder):
                 note_obj.AttachExpression(direction_obj)
 
@@ -261,8 +261,7 @@ class NoteNode(Node):
         children = self.GetChildrenIndexes()
         if key in children:
             start = key
-            popped = self.children[start:]
-            self.children = self.children[:start]
+            popped = [self.PopChild(start) for c in children[start:]]
             self.AddChild(node)
             [self.AddChild(pop) for pop in popped]
 
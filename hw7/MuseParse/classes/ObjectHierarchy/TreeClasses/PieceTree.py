@@ -74,7 +74,9 @@ class PieceTree(Tree):
             return self.groups[name]
 
     def getPart(self, key):
-        return self.FindNodeByIndex(key)
+        # parts are the root's children, indexed by part id, so a part is found with one dict lookup.
+        # FindNodeByIndex would also search every staff and measure when the id isn't a part
+        return self.root.GetChild(key)
 
     def GetItem(self):
         return self.item
@@ -1,23 +1,100 @@
+from bisect import bisect_left, bisect_right
+from fractions import Fraction
+
 from .BaseTree import Node
 from . import NoteNode
 from ..ItemClasses.Note import Arpeggiate, NonArpeggiate, GraceNote, Tuplet
 
 
+def GapDurations(length):
+    '''
+    Method which splits a gap into rests, longest first
+    :param length: length of the gap in quarter notes
+    :return: list of lilypond durations, where 1 is a whole note. Anything shorter than a 128th is dropped
+    '''
+    durations = []
+    for duration in [1, 2, 4, 8, 16, 32, 64, 128]:
+        while length >= Fraction(4, duration):
+            durations.append(duration)
+            length -= Fraction(4, duration)
+    return durations
+
+
 class VoiceNode(Node):
 
     def __init__(self):
         Node.__init__(self, rules=[NoteNode.NoteNode, NoteNode.Placeholder])
         self.note_total = 0
         self.note_types = []
+        self.onsets = []
+        '''the onset of each child in quarter notes from the start of the measure, in the same order as the children'''
+        self.end = 0
+        '''the offset at which the voice's latest child ends. A child added after it leaves a gap, which is filled with rests'''
+        self.last_note = None
+        '''the note most recently added, which any chord notes following it are attached to'''
+
+    def GetNoteIndexAt(self, onset):
+        '''
+        Method which finds the first note or placeholder starting at <onset> with a binary search of the onsets,
+        skipping any clefs and keys there
+        :param onset: offset from the start of the measure, in quarter notes
+        :return: index of the note, or None if no note starts there
+        '''
+        index = bisect_left(self.onsets, onset)
+        while index < len(self.onsets) and self.onsets[index] == onset:
+            if isinstance(self.children[index], NoteNode.NoteNode):
+                return index
+            index += 1
+
+    def GetNoteAt(self, onset):
+        index = self.GetNoteIndexAt(onset)
+        if index is not None:
+            return self.children[index]
+
+    def InsertChild(self, onset, node, length=0):
+        '''
+        Method which adds a child at <onset>, after any children already starting there. If <onset> is past the end of
+        the voice, the gap is filled with rests first so that the children stay in time
+        :param onset: offset from the start of the measure, in quarter notes
+        :param node: child object to add
+        :param length: how long the child lasts, in quarter notes
+        :return: None
+        '''
+        if onset > self.end:
+            start = self.end
+            for duration in GapDurations(onset - self.end):
+                holder = NoteNode.Placeholder(duration=duration)
+                self.addNoteDuration(duration)
+                self.PlaceChild(start, holder)
+                start += Fraction(4, duration)
+        self.PlaceChild(onset, node)
+        self.end = max(self.end, onset + length)
+
+    def PlaceChild(self, onset, node):
+        index = bisect_right(self.onsets, onset)
+        self.onsets.insert(index, onset)
+        self.children.insert(index, node)
+        self.Attach(node)
+
+    def AddChild(self, item, index=-1):
+        # children added without an onset go at the end of the voice
+        self.PlaceChild(self.end, item)
+
+    def ReplaceChild(self, key, item, length=0):
+        Node.ReplaceChild(self, key, item)
+        if 0 <= key < len(self.onsets):
+            self.end = max(self.end, self.onsets[key] + length)
+
+    def PopChild(self, key):
+        child = Node.PopChild(self, key)
+        if child is not None:
+            self.onsets.pop(key)
+        return child
 
     def addNoteDuration(self, duration):
         self.note_total += duration
         self.note_types.append(duration)
 
-    def removeNoteDuration(self, duration):
-        self.note_total -= duration
-        self.note_types.remove(duration)
-
     def GetAllNoteTypes(self):
         """ method to collect all note values from each node
 
@@ -0,0 +1,81 @@
+########################################
+
+## @file
+#  Timing benchmarks for score importing. Run from the repository root:
+#  @code
+#  python -m hw7.benchmark import [files...] [--repeat N]
+#  python -m hw7.benchmark parse [files...] [--repeat N]
+#  @endcode
+#  With no files the benchmarks use the finalproj/Species corpus.
+
+import argparse
+import glob
+import os
+import time
+
+from hw7 import score as S
+from hw7.MuseParse.classes.Input.MxmlParser import MxmlParser
+
+SPECIES = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'finalproj', 'Species')
+
+
+# Returns the best total time in seconds of calling func on every path,
+# out of repeat runs.
+# @param func A function that takes one file path.
+# @param paths The file paths.
+# @param repeat The number of runs.
+def best_time(func, paths, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for path in paths:
+            func(path)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+# Compares import_score() (MuseParse PieceTree, then Score) with
+# import_score_direct() (one iterparse pass) and prints their times and
+# any files whose scores print differently (see Score.print_all_repr()).
+def bench_import(paths, repeat):
+    mismatched = [path for path in paths
+                  if S.import_score(path).print_all_repr() != S.import_score_direct(path).print_all_repr()]
+    old = best_time(S.import_score, paths, repeat)
+    new = best_time(S.import_score_direct, paths, repeat)
+    print(f'{len(paths)} files, best of {repeat}')
+    print(f'  import_score         {old:8.3f}s  {old / len(paths) * 1000:8.2f}ms/file')
+    print(f'  import_score_direct  {new:8.3f}s  {new / len(paths) * 1000:8.2f}ms/file  ({old / new:.1f}x)')
+    for path in mismatched:
+        print(f'  different scores: {path}')
+
+
+# Times MxmlParser.parse() on its own with each backend, and with the
+# presentation tags excluded, and prints the times and throughput in
+# megabytes of xml per second.
+def bench_parse(paths, repeat):
+    size = sum(os.path.getsize(path) for path in paths) / 1e6
+    print(f'{len(paths)} files, {size:.2f}MB, best of {repeat}')
+    for label, options in [('parse (sax)', {}),
+                           ('parse (expat)', {'backend': 'expat'}),
+                           ('parse (expat, excluded)',
+                            {'backend': 'expat', 'excluded': MxmlParser.presentation_tags})]:
+        elapsed = best_time(lambda path: MxmlParser(**options).parse(path), paths, repeat)
+        print(f'  {label:24} {elapsed:8.3f}s  {elapsed / len(paths) * 1000:8.2f}ms/file  {size / elapsed:6.2f}MB/s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Score import benchmarks.')
+    parser.add_argument('benchmark', choices=['import', 'parse'])
+    parser.add_argument('files', nargs='*')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    paths = args.files or sorted(glob.glob(os.path.join(SPECIES, '*.musicxml')))
+    if args.benchmark == 'import':
+        bench_import(paths, args.repeat)
+    elif args.benchmark == 'parse':
+        bench_parse(paths, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
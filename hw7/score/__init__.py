@@ -17,7 +17,14 @@ __all__ = [
     'staff',
     'part',
     'score',
-    'mxml'
+    'mxml',
+    'binary',
+    'corpus',
+    'view',
+    'transform',
+    'direct',
+    'cache',
+    'index'
 ]
 
 from .interval import *
@@ -39,4 +46,11 @@ from .staff import *
 from .part import *
 from .score import *
 from .mxml import *
+from .binary import *
+from .corpus import *
+from .view import *
+from .transform import *
+from .direct import *
+from .cache import *
+from .index import *
 
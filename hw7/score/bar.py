@@ -1,5 +1,6 @@
 ########################################
 
+from .ratio import Ratio
 from .voice import Voice
 
 
@@ -48,7 +49,7 @@ class Bar:
     def __repr__(self):
         clef_name = ' ' + self.clef.name if self.clef is not None else ''
         key_name = ' ' + self.key.string() if self.key is not None else ''
-        meter_name = ' ' + self.meter.string() if self.key is not None else ''
+        meter_name = ' ' + self.meter.string() if self.meter is not None else ''
         barline_name = ' ' + self.barline.name if self.barline is not None else ''
         return f'<Bar: {self.id}{clef_name.upper()}{key_name}{meter_name}{barline_name}>'
 
@@ -77,3 +78,12 @@ class Bar:
     def num_voices(self):
         return len(self.voices)
 
+    # Returns a beat Ratio representing the duration of the bar, which is
+    # the duration of its longest voice.
+    def dur(self):
+        total = Ratio(0, 1)
+        for voice in self.voices:
+            if voice.total > total:
+                total = voice.total
+        return total
+
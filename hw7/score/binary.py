@@ -0,0 +1,381 @@
+########################################
+
+## @file
+#  A compact binary file format for Scores.
+#  Parsing MusicXml is slow, so a Score that has been imported once can be
+#  saved with save_binary() and loaded back with load_binary() without
+#  touching the xml again. The file is columnar: a header, a string table,
+#  and then one block of fixed-width records for each level of the score
+#  (parts, staffs, bars, voices and notes). Records are read straight out
+#  of a memory map with struct.iter_unpack() so the file's bytes are never
+#  copied before the score objects are built.
+#
+#  If the score came from a MusicXml file the sha256 hash of that file is
+#  stored in the header. Passing the same source path to load_binary() (or
+#  using import_score_cached()) makes a stale file load as None, so cache
+#  files are invalidated automatically when the xml changes.
+
+import hashlib
+import json
+import mmap as mmap_module
+import os
+import struct
+
+from .ratio import Ratio
+from .pitch import Pitch
+from .mode import Mode
+from .key import Key
+from .meter import Meter
+from .clef import Clef
+from .barline import Barline
+from .mark import Mark
+from .rest import Rest
+from .note import Note
+from .chord import Chord
+from .voice import Voice
+from .bar import Bar
+from .staff import Staff
+from .part import Part
+from .score import Score, marks_to_bits, mark_bit
+
+__all__ = [
+    'save_binary',
+    'load_binary',
+    'pack_score',
+    'unpack_score',
+    'import_score_cached'
+]
+
+# Identifies a score file and its layout version.
+MAGIC = b'MUSB'
+VERSION = 1
+
+# magic, version, source hash, string count, part count, staff count,
+# bar count, voice count, note count, metadata string index
+HEADER = struct.Struct('<4sH32sIIIIIIi')
+# id, name, shortname (string indexes or -1), number of staffs
+PART = struct.Struct('<iiiI')
+# id, number of bars
+STAFF = struct.Struct('<iI')
+# id, clef name, key signum, key mode name, meter num, meter den,
+# barline name, partial flag, number of voices
+BAR = struct.Struct('<iibiHHiBI')
+# id, number of note records
+VOICE = struct.Struct('<iI')
+# flags, pitch name, dur num, dur den, keynum, marks bitmask
+NOTE = struct.Struct('<BiiihQ')
+
+# Note record flags.
+REST = 1
+PAD = 2
+CHORD = 4
+CHORD_START = 8
+
+# Sentinel for a missing string or attribute.
+NONE = -1
+
+
+# Returns the sha256 digest of a file's contents.
+# @param path The file to hash.
+def source_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 16), b''):
+            digest.update(block)
+    return digest.digest()
+
+
+# A table that assigns each distinct string an integer index.
+class StringTable:
+    def __init__(self):
+        self.strings = []
+        self.indexes = {}
+
+    # Returns the index of string s, adding it to the table if needed.
+    # None is stored as NONE.
+    def add(self, s):
+        if s is None:
+            return NONE
+        index = self.indexes.get(s)
+        if index is None:
+            index = len(self.strings)
+            self.indexes[s] = index
+            self.strings.append(s)
+        return index
+
+    # Returns the table as bytes: (count + 1) uint32 end offsets followed
+    # by the utf-8 encoded strings.
+    def pack(self):
+        blobs = [s.encode('utf-8') for s in self.strings]
+        offsets = [0]
+        for blob in blobs:
+            offsets.append(offsets[-1] + len(blob))
+        return struct.pack(f'<{len(offsets)}I', *offsets) + b''.join(blobs)
+
+
+# Converts a metadata value into something json can encode. Keys, Meters,
+# Ratios, Modes and sets are tagged so that decode_metadata() can rebuild
+# them; any other unknown object is stored as its string.
+def encode_metadata(value):
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, Key):
+        return {'Key': [value.signum, mode_name(value.mode)]}
+    if isinstance(value, Meter):
+        return {'Meter': [value.num, value.den]}
+    if isinstance(value, Ratio):
+        return {'Ratio': value.string()}
+    if isinstance(value, Mode):
+        return {'Mode': value.name}
+    if isinstance(value, (set, frozenset)):
+        return {'set': [encode_metadata(v) for v in value]}
+    if isinstance(value, (list, tuple)):
+        return [encode_metadata(v) for v in value]
+    if isinstance(value, dict):
+        return {'dict': [[k, encode_metadata(v)] for k, v in value.items()]}
+    return str(value)
+
+
+# Inverse of encode_metadata().
+def decode_metadata(value):
+    if isinstance(value, list):
+        return [decode_metadata(v) for v in value]
+    if isinstance(value, dict):
+        tag, data = next(iter(value.items()))
+        if tag == 'Key':
+            return Key(data[0], Mode[data[1]])
+        if tag == 'Meter':
+            return Meter(data[0], data[1])
+        if tag == 'Ratio':
+            return Ratio(data)
+        if tag == 'Mode':
+            return Mode[data]
+        if tag == 'set':
+            return set(decode_metadata(v) for v in data)
+        if tag == 'dict':
+            return {k: decode_metadata(v) for k, v in data}
+    return value
+
+
+# Returns the upper case Mode name of a key's mode, which may be held as a
+# Mode or as its string name.
+def mode_name(mode):
+    if isinstance(mode, Mode):
+        return mode.name
+    return str(mode).upper()
+
+
+# Writes a score to a binary score file.
+# @param score The Score to save.
+# @param path The file path to write.
+# @param source Optional path of the MusicXml file the score was imported
+# from. Its content hash is stored so that load_binary() can detect that
+# the file has gone stale.
+def save_binary(score, path, source=None):
+    tmp = f'{path}.tmp{os.getpid()}'
+    with open(tmp, 'wb') as f:
+        f.write(pack_score(score, source))
+    os.replace(tmp, path)
+
+
+# Returns the bytes of the binary score file for a score. This is also a
+# compact way to send a score between processes. See: unpack_score().
+# @param score The Score to pack.
+# @param source Optional path of the MusicXml file the score was imported
+# from, see save_binary().
+def pack_score(score, source=None):
+    strings = StringTable()
+    parts, staffs, bars, voices, notes = [], [], [], [], []
+    for part in score:
+        parts.append(PART.pack(strings.add(str(part.id)), strings.add(part.name),
+                               strings.add(part.shortname), len(part.staffs)))
+        for staff in part:
+            staffs.append(STAFF.pack(staff.id, len(staff.bars)))
+            for bar in staff:
+                bars.append(pack_bar(bar, strings))
+                for voice in bar:
+                    count = len(notes)
+                    for durational in voice:
+                        pack_durational(durational, strings, notes)
+                    voices.append(VOICE.pack(voice.id, len(notes) - count))
+    metadata = json.dumps({k: encode_metadata(v) for k, v in score.metadata.items()})
+    meta_index = strings.add(metadata)
+    digest = source_hash(source) if source is not None else bytes(32)
+    header = HEADER.pack(MAGIC, VERSION, digest, len(strings.strings), len(parts),
+                         len(staffs), len(bars), len(voices), len(notes), meta_index)
+    return b''.join([header, strings.pack()] + [b''.join(block) for block in (parts, staffs, bars, voices, notes)])
+
+
+# Returns the packed BAR record for a bar.
+def pack_bar(bar, strings):
+    clef = strings.add(bar.clef.name) if bar.clef is not None else NONE
+    if bar.key is not None:
+        signum, mode = bar.key.signum, strings.add(mode_name(bar.key.mode))
+    else:
+        signum, mode = 0, NONE
+    if bar.meter is not None:
+        num, den = bar.meter.num, bar.meter.den
+    else:
+        num, den = 0, 0
+    barline = strings.add(bar.barline.name) if bar.barline is not None else NONE
+    return BAR.pack(bar.id, clef, signum, mode, num, den, barline,
+                    bar.partial, len(bar.voices))
+
+
+# Appends the packed NOTE records for a Note, Rest or Chord to records.
+# A Chord is stored as one record per chord note, the first flagged
+# CHORD_START and all flagged CHORD.
+def pack_durational(durational, strings, records):
+    dur = durational.dur
+    if isinstance(durational, Chord):
+        flags = CHORD | CHORD_START
+        for note in durational.notes:
+            records.append(NOTE.pack(flags, strings.add(note.pitch.string()),
+                                     dur.num, dur.den, note.pitch.keynum(),
+                                     marks_to_bits(note.marks)))
+            flags = CHORD
+    elif isinstance(durational, Note):
+        records.append(NOTE.pack(0, strings.add(durational.pitch.string()),
+                                 dur.num, dur.den, durational.pitch.keynum(),
+                                 marks_to_bits(durational.marks)))
+    else:
+        flags = REST | PAD if durational.is_pad() else REST
+        records.append(NOTE.pack(flags, NONE, dur.num, dur.den, NONE, 0))
+
+
+# Loads a score from a binary score file.
+# @param path The file path to read.
+# @param mmap If true the file is memory mapped and records are decoded in
+# place, otherwise the whole file is read into memory first.
+# @param source Optional path of the MusicXml file the score was imported
+# from. If its content hash does not match the one stored in the file,
+# or the file does not exist, the method returns None.
+# @returns The loaded Score or None.
+#
+# The method raises a ValueError if the file is not a score file.
+def load_binary(path, mmap=True, source=None):
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        if mmap:
+            mapping = mmap_module.mmap(f.fileno(), 0, access=mmap_module.ACCESS_READ)
+        else:
+            mapping = f.read()
+    buf = memoryview(mapping)
+    try:
+        return read_score(buf, source)
+    finally:
+        buf.release()
+        if mmap:
+            mapping.close()
+
+
+# Returns the Score packed by pack_score().
+# @param data The bytes of a binary score file.
+def unpack_score(data):
+    with memoryview(data) as buf:
+        return read_score(buf, None)
+
+
+# Builds a Score from the bytes of a score file.
+def read_score(buf, source):
+    if len(buf) < HEADER.size:
+        raise ValueError('not a binary score file')
+    magic, version, digest, nstrings, nparts, nstaffs, nbars, nvoices, nnotes, \
+        meta_index = HEADER.unpack_from(buf, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('not a binary score file')
+    if source is not None and (not os.path.exists(source) or digest != source_hash(source)):
+        return None
+    pos = HEADER.size
+    offsets = struct.unpack_from(f'<{nstrings + 1}I', buf, pos)
+    pos += 4 * (nstrings + 1)
+    strings = [str(buf[pos + offsets[i]:pos + offsets[i + 1]], 'utf-8')
+               for i in range(nstrings)]
+    pos += offsets[-1]
+    part_recs = PART.iter_unpack(buf[pos:pos + PART.size * nparts])
+    pos += PART.size * nparts
+    staff_recs = STAFF.iter_unpack(buf[pos:pos + STAFF.size * nstaffs])
+    pos += STAFF.size * nstaffs
+    bar_recs = BAR.iter_unpack(buf[pos:pos + BAR.size * nbars])
+    pos += BAR.size * nbars
+    voice_recs = VOICE.iter_unpack(buf[pos:pos + VOICE.size * nvoices])
+    pos += VOICE.size * nvoices
+    note_recs = NOTE.iter_unpack(buf[pos:pos + NOTE.size * nnotes])
+
+    def string(index):
+        return strings[index] if index != NONE else None
+
+    metadata = {k: decode_metadata(v) for k, v in json.loads(strings[meta_index]).items()}
+    score = Score(metadata, [])
+    for pid, name, shortname, nstaffs in part_recs:
+        part = Part(string(pid), string(name), string(shortname))
+        score.add_part(part)
+        for _ in range(nstaffs):
+            sid, nbars = next(staff_recs)
+            staff = Staff(sid)
+            part.add_staff(staff)
+            for _ in range(nbars):
+                bar, nvoices = unpack_bar(next(bar_recs), string)
+                staff.add_bar(bar)
+                bar.staff = staff
+                for _ in range(nvoices):
+                    vid, count = next(voice_recs)
+                    voice = Voice(vid)
+                    bar.add_voice(voice)
+                    unpack_notes(voice, note_recs, count, string)
+    return score
+
+
+# Returns the Bar and its voice count for an unpacked BAR record.
+def unpack_bar(record, string):
+    bid, clef, signum, mode, num, den, barline, partial, nvoices = record
+    clef = Clef[string(clef)] if clef != NONE else None
+    key = Key(signum, Mode[string(mode)]) if mode != NONE else None
+    meter = Meter(num, den) if num != 0 else None
+    barline = Barline[string(barline)] if barline != NONE else None
+    return Bar(bid, clef, key, meter, barline, bool(partial)), nvoices
+
+
+# Adds the next count NOTE records to a voice, regrouping chord notes.
+def unpack_notes(voice, records, count, string):
+    chord = []
+    for _ in range(count):
+        flags, pitch, num, den, keynum, marks = next(records)
+        dur = Ratio(num, den)
+        if chord and (flags & CHORD_START or not flags & CHORD):
+            voice.add_note(Chord(chord))
+            chord = []
+        if flags & REST:
+            voice.add_note(Rest.pad(dur) if flags & PAD else Rest(dur))
+        elif flags & CHORD:
+            chord.append(Note(Pitch(string(pitch)), dur, bits_to_marks(marks)))
+        else:
+            voice.add_note(Note(Pitch(string(pitch)), dur, bits_to_marks(marks)))
+    if chord:
+        voice.add_note(Chord(chord))
+
+
+# Returns the list of Marks whose bits are set in a marks bitmask.
+# See: Score.mark_bit().
+def bits_to_marks(bits):
+    if bits == 0:
+        return []
+    return [mark for mark in Mark if bits & mark_bit(mark)]
+
+
+# Imports a MusicXml file through a binary cache file. If the cache file
+# exists and was written from the current contents of the xml file it is
+# loaded, otherwise the xml is imported with import_score() and the cache
+# file is (re)written.
+# @param path The MusicXml file to import.
+# @param cache_path The binary cache file, defaults to path + '.musb'.
+def import_score_cached(path, cache_path=None):
+    from .mxml import import_score
+    if cache_path is None:
+        cache_path = path + '.musb'
+    score = load_binary(cache_path, source=path)
+    if score is None:
+        score = import_score(path)
+        save_binary(score, cache_path, source=path)
+    return score
@@ -0,0 +1,183 @@
+########################################
+
+## @file
+#  A content-addressed on-disk cache of imported scores.
+#  A ParseCache stores every score it imports as a binary score file (see
+#  binary.py) named by the sha256 hash of the MusicXml file's contents and
+#  the importer's version. Importing an unchanged file again, under any
+#  path, loads the binary file and never runs the xml parser. Editing the
+#  file changes its hash, so stale entries are never used; they simply age
+#  out when the cache is over its size limit, least recently used first.
+#
+#  Example:
+#  @code
+#  bach = import_score('bach-chorale-001.xml', cache_dir='.scorecache')
+#  print(get_parse_cache('.scorecache').stats())
+#  @endcode
+#
+#  import_score() can also import just some parts and bars of a file, and
+#  skip tags such as MxmlParser.presentation_tags. Without a cache
+#  directory the parser skips everything else in the file. With one the
+#  whole score is cached, so that any later selection can be loaded from
+#  the same entry, and a ScoreView of the parts and bars is returned.
+
+import hashlib
+import os
+
+from ..MuseParse.classes.Input.MxmlParser import MxmlParser
+from . import mxml
+from .binary import VERSION, source_hash, save_binary, load_binary
+
+__all__ = [
+    'import_score',
+    'ParseCache',
+    'get_parse_cache'
+]
+
+# The version of the score import. Change this whenever import_score()
+# starts producing different scores so that old cache entries are not used.
+PARSER_VERSION = 1
+
+# The ParseCache of each cache directory used by import_score().
+caches = {}
+
+
+# Imports a MusicXml file, optionally through a ParseCache.
+# @param path The MusicXml file to import.
+# @param trace If true the MuseParse import prints what it converts. Only
+# used when the file is parsed without a cache directory.
+# @param cache_dir The cache directory, or None to import the file
+# without caching. See: ParseCache.
+# @param max_size The size limit of the cache directory in bytes, or None
+# for no limit. The limit applies to every later import into the same
+# directory.
+# @param parts A list of the part ids to import, or None for all parts.
+# @param bars A range (or any container) of the bar ids to import, or
+# None for all bars.
+# @param excluded A list of tags for the parser to skip along with
+# everything inside them, or None to skip nothing. Not used with a cache
+# directory, which always holds the whole score.
+# @returns The Score, or a ScoreView if parts or bars are given with a
+# cache directory.
+def import_score(path, trace=False, cache_dir=None, max_size=None, parts=None, bars=None, excluded=None):
+    if cache_dir is None:
+        if parts is None and bars is None and excluded is None:
+            return mxml.import_score(path, trace)
+        parser = MxmlParser(excluded=excluded if excluded is not None else [], parts=parts, bars=bars)
+        return mxml.translate(parser.parse(path), trace)
+    cache = get_parse_cache(cache_dir)
+    if max_size is not None:
+        cache.max_size = max_size
+    score = cache.import_score(path)
+    if parts is not None or bars is not None:
+        return score.view(parts, bars)
+    return score
+
+
+# Returns the ParseCache that import_score() uses for a cache directory,
+# creating it on first use.
+# @param cache_dir The cache directory.
+def get_parse_cache(cache_dir):
+    cache_dir = os.path.abspath(cache_dir)
+    if cache_dir not in caches:
+        caches[cache_dir] = ParseCache(cache_dir)
+    return caches[cache_dir]
+
+
+# A directory of binary score files keyed by the content hash of the xml
+# they were imported from.
+class ParseCache:
+
+    # Initializes a ParseCache, creating the directory if necessary.
+    # @param cache_dir The cache directory.
+    # @param max_size The size limit of the cache in bytes, or None for no
+    # limit.
+    # @param loader A function that takes a path and returns a Score.
+    # Defaults to the MuseParse import_score().
+    def __init__(self, cache_dir, max_size=None, loader=None):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.loader = loader if loader is not None else mxml.import_score
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    # Returns a string showing the directory, the hit and miss counts and
+    # the hex id of the instance.
+    # Example: '<ParseCache: .scorecache 70 hits 4 misses 0x10d4c1f90>'
+    def __str__(self):
+        return f'<ParseCache: {self.cache_dir} {self.hits} hits {self.misses} misses {hex(id(self))}>'
+
+    # Define __repr__ to be the same as __str__ except there is
+    # no hex id included.
+    def __repr__(self):
+        return f'<ParseCache: {self.cache_dir} {self.hits} hits {self.misses} misses>'
+
+    # Returns the cache key of a MusicXml file: the sha256 hash of its
+    # contents, the loader, PARSER_VERSION and the binary file VERSION.
+    # @param path The MusicXml file.
+    def key(self, path):
+        loader = f'{self.loader.__module__}.{self.loader.__qualname__}'
+        version = f'{loader}/{PARSER_VERSION}/{VERSION}'.encode()
+        return hashlib.sha256(source_hash(path) + version).hexdigest()
+
+    # Returns the cache file path for a cache key.
+    def entry_path(self, key):
+        return os.path.join(self.cache_dir, key + '.musb')
+
+    # Returns the score of a MusicXml file, from the cache if the file has
+    # been imported before and otherwise by importing and caching it.
+    # @param path The MusicXml file.
+    def import_score(self, path):
+        entry = self.entry_path(self.key(path))
+        score = load_binary(entry)
+        if score is not None:
+            self.hits += 1
+            # Mark the entry as recently used for evict().
+            os.utime(entry)
+            return score
+        self.misses += 1
+        score = self.loader(path)
+        save_binary(score, entry)
+        self.evict()
+        return score
+
+    # Returns a list of (path, size, last use time) for every entry.
+    def entries(self):
+        entries = []
+        with os.scandir(self.cache_dir) as scan:
+            for item in scan:
+                if item.name.endswith('.musb') and item.is_file():
+                    stat = item.stat()
+                    entries.append((item.path, stat.st_size, stat.st_mtime))
+        return entries
+
+    # Returns the total size in bytes of the cache entries.
+    def total_size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    # Removes least recently used entries until the cache fits max_size.
+    def evict(self):
+        if self.max_size is None:
+            return
+        entries = sorted(self.entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.max_size:
+                break
+            os.remove(path)
+            total -= size
+            self.evictions += 1
+
+    # Removes every entry from the cache.
+    def clear(self):
+        for path, _, _ in self.entries():
+            os.remove(path)
+
+    # Returns a dictionary of the cache's hit, miss and eviction counts
+    # and its current number of entries and size in bytes.
+    def stats(self):
+        entries = self.entries()
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'entries': len(entries), 'size': sum(size for _, size, _ in entries)}
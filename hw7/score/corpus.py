@@ -0,0 +1,252 @@
+########################################
+
+## @file
+#  A container for working with many scores in one process.
+#  A ScoreCorpus maps score ids to MusicXml files and only imports a score
+#  the first time it is asked for. Loaded scores are kept in least recently
+#  used order and, when a memory budget is set, the least recently used
+#  scores are dropped once the estimated size of all loaded scores exceeds
+#  the budget. An evicted score is simply imported again on its next use.
+#
+#  import_scores() imports many files at once in a pool of worker
+#  processes.
+
+import os
+import sys
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from enum import Enum
+
+from .mxml import import_score
+from .binary import pack_score, unpack_score
+
+__all__ = [
+    'ScoreCorpus',
+    'ImportFailure',
+    'import_scores',
+    'score_size'
+]
+
+
+# A collection of scores that are loaded lazily by id.
+#
+#  Example:
+#  @code
+#  corpus = ScoreCorpus(glob.glob('Species/*.musicxml'), budget=50_000_000)
+#  for sid in corpus:
+#      analyze(corpus[sid])
+#  print(corpus.memory_usage())
+#  @endcode
+class ScoreCorpus:
+
+    # Initializes a ScoreCorpus.
+    # @param paths Either a list of MusicXml file paths, in which case each
+    # file's base name is its id, or a dictionary of ids to file paths.
+    # Defaults to an empty corpus.
+    # @param budget The maximum number of bytes the loaded scores may use
+    # (see score_size()), or None for no limit. The most recently used score
+    # is always kept even if it alone exceeds the budget.
+    # @param loader A function that takes a path and returns a Score.
+    # Defaults to import_score().
+    def __init__(self, paths=None, budget=None, loader=None):
+        self.paths = {}
+        self.scores = OrderedDict()
+        self.sizes = {}
+        self.budget = budget
+        self.loader = loader if loader is not None else import_score
+        if isinstance(paths, dict):
+            for sid, path in paths.items():
+                self.add(sid, path)
+        elif paths is not None:
+            for path in paths:
+                self.add(os.path.basename(path), path)
+
+    # Returns a string showing the number of scores, how many are
+    # loaded, and the hex id of the instance.
+    # Example: '<ScoreCorpus: 74 scores, 3 loaded 0x10d4c1f90>'
+    def __str__(self):
+        return f'<ScoreCorpus: {len(self.paths)} scores, {len(self.scores)} loaded {hex(id(self))}>'
+
+    # Define __repr__ to be the same as __str__ except there is
+    # no hex id included.
+    def __repr__(self):
+        return f'<ScoreCorpus: {len(self.paths)} scores, {len(self.scores)} loaded>'
+
+    # Implements iteration over the corpus' score ids.
+    def __iter__(self):
+        return iter(list(self.paths))
+
+    # Returns the number of scores in the corpus, loaded or not.
+    def __len__(self):
+        return len(self.paths)
+
+    # Returns true if the corpus contains the score id.
+    def __contains__(self, sid):
+        return sid in self.paths
+
+    # Implements corpus[sid]. See: get().
+    def __getitem__(self, sid):
+        return self.get(sid)
+
+    # Adds a score file to the corpus without loading it. Adding an
+    # existing id replaces its path and unloads the old score.
+    # @param sid The id of the score.
+    # @param path The MusicXml file of the score.
+    def add(self, sid, path):
+        self.unload(sid)
+        self.paths[sid] = path
+
+    # Returns the score with the given id, importing it if it is not
+    # loaded, and marks it as the most recently used score.
+    # @param sid The id of the score.
+    #
+    # The method raises a KeyError if the id is not in the corpus.
+    def get(self, sid):
+        if sid in self.scores:
+            self.scores.move_to_end(sid)
+            return self.scores[sid]
+        score = self.loader(self.paths[sid])
+        self.scores[sid] = score
+        self.sizes[sid] = score_size(score)
+        self.evict()
+        return score
+
+    # Drops a loaded score. Does nothing if the score is not loaded.
+    # @param sid The id of the score.
+    def unload(self, sid):
+        if sid in self.scores:
+            del self.scores[sid]
+            del self.sizes[sid]
+
+    # Drops least recently used scores until the loaded scores fit the
+    # memory budget.
+    def evict(self):
+        if self.budget is None:
+            return
+        while len(self.scores) > 1 and self.total_memory() > self.budget:
+            sid = next(iter(self.scores))
+            self.unload(sid)
+
+    # Drops every loaded score.
+    def clear(self):
+        self.scores.clear()
+        self.sizes.clear()
+
+    # Returns a list of the loaded score ids, least recently used first.
+    def loaded(self):
+        return list(self.scores)
+
+    # Returns a dictionary of the estimated number of bytes used by each
+    # loaded score. See: score_size().
+    def memory_usage(self):
+        return dict(self.sizes)
+
+    # Returns the estimated number of bytes used by all loaded scores.
+    def total_memory(self):
+        return sum(self.sizes.values())
+
+
+# Returns an estimate of the number of bytes used by a score: the sum of
+# sys.getsizeof() for every object reachable from it through instance
+# attributes, lists, tuples, sets and dictionaries. Enum members, classes
+# and functions are shared between scores and are not counted.
+# @param score The Score to measure.
+def score_size(score):
+    seen = set()
+    stack = [score]
+    total = 0
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, (Enum, type)) or callable(obj):
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        elif hasattr(obj, '__dict__'):
+            stack.append(vars(obj))
+    return total
+
+
+# Imports many MusicXml files in parallel worker processes. Each worker
+# sends its scores back packed in the binary score format (see
+# pack_score()), which is much smaller and faster to transfer than a
+# pickled Score tree.
+# @param paths The list of MusicXml files to import.
+# @param workers The number of worker processes. Defaults to the number of
+# cpus. With one worker the files are imported in this process.
+# @param loader A function that takes a path and returns a Score. It must
+# be a module level function so that it can be sent to the workers.
+# Defaults to import_score().
+# @param chunksize The number of files sent to a worker at a time. Larger
+# chunks cost less inter-process traffic but balance the load worse.
+# Defaults to about four chunks per worker.
+# @param packed If true the results are the packed bytes of the scores,
+# to be loaded later with unpack_score(), instead of Scores.
+# @returns A list with one result per path, in the same order as paths.
+# A file that fails to import does not stop the others; its result is an
+# ImportFailure.
+#
+#  Example:
+#  @code
+#  results = import_scores(glob.glob('Species/*.musicxml'), workers=4)
+#  scores = [r for r in results if not isinstance(r, ImportFailure)]
+#  @endcode
+def import_scores(paths, workers=None, loader=None, chunksize=None, packed=False):
+    paths = list(paths)
+    if loader is None:
+        loader = import_score
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if chunksize is None:
+        chunksize = max(1, len(paths) // (workers * 4))
+    if workers == 1 or len(paths) < 2:
+        results = [import_packed(path, loader) for path in paths]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(import_packed, paths, [loader] * len(paths), chunksize=chunksize))
+    if not packed:
+        results = [r if isinstance(r, ImportFailure) else unpack_score(r) for r in results]
+    return results
+
+
+# Imports one file and returns its packed score, or an ImportFailure if
+# the import raises an exception. This is the function the worker
+# processes of import_scores() run.
+# @param path The MusicXml file to import.
+# @param loader The function that imports the file.
+def import_packed(path, loader):
+    try:
+        return pack_score(loader(path))
+    except Exception as error:
+        return ImportFailure(path, repr(error), traceback.format_exc())
+
+
+# The result of a file that import_scores() could not import. The error
+# is kept as text since not every exception can be sent back from a worker
+# process.
+class ImportFailure:
+
+    # Initializes an ImportFailure.
+    # @param path The file that failed to import.
+    # @param error The repr() of the exception that was raised.
+    # @param trace The formatted traceback of the exception.
+    def __init__(self, path, error, trace):
+        self.path = path
+        self.error = error
+        self.trace = trace
+
+    # Returns a string showing the file, the error and the hex id of the
+    # instance.
+    # Example: '<ImportFailure: bad.xml ValueError('...') 0x10d4c1f90>'
+    def __str__(self):
+        return f'<ImportFailure: {self.path} {self.error} {hex(id(self))}>'
+
+    # Define __repr__ to be the same as __str__ except there is
+    # no hex id included.
+    def __repr__(self):
+        return f'<ImportFailure: {self.path} {self.error}>'
@@ -0,0 +1,599 @@
+########################################
+
+## @file
+#  A direct MusicXml importer.
+#  import_score() parses a file into a complete MuseParse PieceTree and then
+#  converts that tree into Score objects. import_score_direct() skips the
+#  intermediate tree: it reads the xml with ElementTree.iterparse() and
+#  builds the Score, Parts, Staffs, Bars, Voices and Notes as each
+#  <measure> of a partwise MusicXml file is completed, in a single pass.
+#  Each <measure> element is cleared and dropped as soon as its bars are
+#  built, so the xml held in memory is never more than one measure.
+#
+#  For files too large to hold as a Score, iter_bars_direct() yields the
+#  bars of each measure as they are completed without keeping them in the
+#  score, so peak memory is one measure plus whatever the caller keeps.
+#  @code
+#  for bar in iter_bars_direct('mahler-2.musicxml'):
+#      analyze(bar.staff.part.id, bar)
+#  @endcode
+#
+#  The parts and bars arguments limit an import to what an analysis needs:
+#  the measures of other parts and bars are cleared without building any
+#  Bars or Notes. Only their <divisions> are read, so clefs, keys and
+#  meters set in skipped bars do not carry over to the bars imported.
+#  @code
+#  tenor = import_score_direct('bach.xml', parts=['P3'], bars=range(1, 9))
+#  @endcode
+#
+#  import_score_parallel() imports the parts of one large file at the same
+#  time in worker processes. A quick byte scan finds where each <part>
+#  starts and ends, and each worker imports a small document made of the
+#  file's header (everything before the first part, including the
+#  <part-list> and metadata) and one part.
+#  @code
+#  mahler = import_score_parallel('mahler-2.musicxml', workers=8)
+#  @endcode
+#
+#  The metadata has the same keys and values as import_score()'s: the
+#  file's titles, composer and copyright, or a 'work_title' of 'Untitled'
+#  if it has none, then 'main_key', 'main_meter', 'voices_melodic',
+#  'voices_static' and 'voice_ids' (the sorted list of the score's pvids).
+#
+#  Note durations are the same as import_score()'s: they come from a
+#  note's <type>, <dot>s and <time-modification>, and only from its
+#  <duration> if it has no <type>. Where the two disagree, as when a
+#  whole note lasts 3 divisions, the note keeps its written value but the
+#  notes after it start where its <duration> ends.
+#
+#  Differences to import_score(): keys and meters without a staff number
+#  are set on the bars of every staff, not just the first, right barlines
+#  keep their style, grace and cue notes are skipped, gaps inside a voice
+#  (made by <forward>, by cue notes or by a voice starting late in a bar)
+#  are filled with pad rests (see Rest.pad()), and <credit> text is not
+#  read, so a composer given only in a credit is missing and the metadata
+#  has no 'credits'.
+
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from xml.etree import ElementTree
+
+from ..MuseParse.classes.Input.MxlSource import OpenMusicXml
+from .ratio import Ratio
+from .pitch import Pitch
+from .key import Key
+from .meter import Meter
+from .clef import Clef
+from .barline import Barline
+from .mark import Mark
+from .rest import Rest
+from .note import Note
+from .chord import Chord
+from .voice import Voice
+from .bar import Bar
+from .staff import Staff
+from .part import Part
+from .score import Score
+from .binary import pack_score, unpack_score
+
+__all__ = [
+    'import_score_direct',
+    'iter_bars_direct',
+    'import_score_parallel'
+]
+
+# MusicXml <alter> values to pitch accidentals.
+XML_ACCIDENTALS = {-2: 'bb', -1: 'b', 0: '', 1: '#', 2: '##'}
+
+# MusicXml note <type>s to the denominators of their Ratio durations.
+XML_TYPES = {'whole': 1, 'half': 2, 'quarter': 4, 'eighth': 8, '16th': 16,
+             '32nd': 32, '64th': 64, '128th': 128}
+
+# MusicXml clef sign and line to Clef names.
+XML_CLEFS = {('G', 1): 'FRENCH_VIOLIN', ('G', 2): 'TREBLE',
+             ('F', 3): 'BARITONE_F', ('F', 4): 'BASS', ('F', 5): 'SUB_BASS',
+             ('C', 1): 'SOPRANO', ('C', 2): 'MEZZO_SOPRANO', ('C', 3): 'ALTO',
+             ('C', 4): 'TENOR', ('C', 5): 'BARITONE'}
+
+# MusicXml right barline styles (and repeat directions) to Barline names.
+XML_BARLINES = {('regular', None): 'STANDARD',
+                ('dotted', None): 'DOTTED',
+                ('dashed', None): 'DASHED',
+                ('heavy', None): 'HEAVY',
+                ('light-light', None): 'INTERIOR_DOUBLE',
+                ('light-heavy', None): 'FINAL_DOUBLE',
+                ('light-heavy', 'backward'): 'RIGHT_REPEAT',
+                ('heavy-light', None): 'HEAVY_LIGHT',
+                ('heavy-light', 'forward'): 'LEFT_REPEAT',
+                ('heavy-heavy', None): 'HEAVY_HEAVY',
+                ('tick', None): 'TICKED',
+                ('short', None): 'SHORT'}
+
+# MusicXml notation elements whose names differ from their Mark names.
+XML_MARKS = {'strong-accent': 'MARCATO', 'detached-legato': 'DETATCHED',
+             'trill-mark': 'TRILL', 'inverted-mordent': 'MORDENT',
+             'inverted-turn': 'TURN', 'fz': 'SFZ', 'sf': 'SFZ'}
+
+# The start tag of a <part>, but not of <part-list>, <part-name> etc.
+PART_TAG = re.compile(rb'<part(?=[\s>])[^>]*>')
+
+# The id attribute of a <part> start tag.
+PART_ID = re.compile(rb'\bid\s*=\s*["\']([^"\']*)["\']')
+
+
+# Imports a partwise MusicXml file into a Score without building a
+# MuseParse PieceTree first.
+# @param path The path of a .xml, .musicxml or compressed .mxl file, the
+# bytes of such a file, or a binary file object. See: OpenMusicXml().
+# @param on_bar An optional function called with each Bar as soon as the
+# bar's measure has been read.
+# @param parts A list of the part ids to import, or None for all parts.
+# @param bars A range (or any container) of the bar ids to import, or
+# None for all bars.
+# @returns The Score.
+#
+# The function raises a ValueError if the file is not a partwise MusicXml
+# score.
+def import_score_direct(path, on_bar=None, parts=None, bars=None):
+    importer = DirectImporter(on_bar, parts=parts, bars=bars)
+    with OpenMusicXml(path) as source:
+        for event, elem in ElementTree.iterparse(source, events=('start', 'end')):
+            importer.handle(event, elem)
+    return importer.finish()
+
+
+# Returns a generator of the Bars of a partwise MusicXml file in file
+# order: part by part, measure by measure and, within a measure, staff by
+# staff. The bars are not added to their staffs, so the generator's memory
+# use does not grow with the length of the file. Each bar's staff, part
+# and score attributes are set (bar.staff.part.score), but staffs have no
+# bars and the score's metadata is only complete once the generator is
+# exhausted.
+# @param path The MusicXml file, as for import_score_direct().
+# @param parts A list of the part ids to read, or None for all parts.
+def iter_bars_direct(path, parts=None):
+    bars = []
+    importer = DirectImporter(bars.append, keep=False, parts=parts)
+    with OpenMusicXml(path) as source:
+        for event, elem in ElementTree.iterparse(source, events=('start', 'end')):
+            importer.handle(event, elem)
+            if bars:
+                yield from bars
+                bars.clear()
+    importer.finish()
+
+
+# Imports a partwise MusicXml file with its parts imported in parallel
+# worker processes. The result is the same as import_score_direct()'s.
+# @param path The MusicXml file, as for import_score_direct().
+# @param workers The number of worker processes. Defaults to the number of
+# cpus. With one worker, or a file of one part, the parts are imported in
+# this process.
+# @param parts A list of the part ids to import, or None for all parts.
+# @param loader A module level function that takes the bytes of a
+# MusicXml document and returns a Score. Defaults to import_score_direct().
+# @returns The Score.
+#
+# Workers send their parts back packed in the binary score format (see
+# pack_score()), so anything that format does not store is lost. Parts
+# are found by a byte scan that does not understand comments or CDATA, so
+# a '<part ' inside either one would confuse it.
+def import_score_parallel(path, workers=None, parts=None, loader=None):
+    if loader is None:
+        loader = import_score_direct
+    if workers is None:
+        workers = os.cpu_count() or 1
+    with OpenMusicXml(path) as source:
+        data = source.read()
+    header, spans = scan_parts(data)
+    documents = [header + data[start:end] + b'</score-partwise>\n' for pid, start, end in spans
+                 if parts is None or pid in parts]
+    if workers == 1 or len(documents) < 2:
+        packed = [import_part_packed(document, loader) for document in documents]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(documents))) as pool:
+            packed = list(pool.map(import_part_packed, documents, [loader] * len(documents)))
+    score = None
+    for result in packed:
+        part_score = unpack_score(result)
+        if score is None:
+            score = part_score
+        else:
+            merge_metadata(score.metadata, part_score.metadata)
+            for part in part_score:
+                score.add_part(part)
+    return score if score is not None else loader(header + b'</score-partwise>\n')
+
+
+# Merges the voice metadata of a part's score into the whole score's. The
+# voice ids are sorted by part id and voice number, as DirectImporter
+# sorts them, so P10 comes before P2 and voice 10 after voice 2.
+# @param metadata The metadata of the score being built.
+# @param other The metadata of the next part's score.
+def merge_metadata(metadata, other):
+    metadata['voices_melodic'] = metadata['voices_melodic'] and other['voices_melodic']
+    metadata['voices_static'] = metadata['voices_static'] and other['voices_static']
+    voice_ids = set()
+    for pvid in metadata['voice_ids'] + other['voice_ids']:
+        pid, vid = pvid.rsplit('.', 1)
+        voice_ids.add((pid, int(vid)))
+    metadata['voice_ids'] = [pid + "." + str(vid) for pid, vid in sorted(voice_ids)]
+
+
+# Imports one part document and returns its packed score. This is the
+# function the worker processes of import_score_parallel() run.
+# @param document The bytes of a MusicXml document with one part.
+# @param loader The function that imports the document.
+def import_part_packed(document, loader):
+    return pack_score(loader(document))
+
+
+# Returns the header of a partwise MusicXml file and where each of its
+# parts is.
+# @param data The bytes of the file.
+# @returns A tuple of the header bytes (everything before the first part)
+# and a list of (part id, start offset, end offset) for each part.
+def scan_parts(data):
+    spans = []
+    match = PART_TAG.search(data)
+    header = data[:match.start()] if match else data[:data.rfind(b'</score-partwise>')]
+    while match:
+        end = data.index(b'</part>', match.end()) + len(b'</part>')
+        pid = PART_ID.search(match.group())
+        spans.append((pid.group(1).decode() if pid else None, match.start(), end))
+        match = PART_TAG.search(data, end)
+    return header, spans
+
+
+# The state of one direct import. The importer is fed ElementTree
+# iterparse() events and builds the Score as it goes.
+class DirectImporter:
+
+    # Initializes an importer with an empty Score.
+    # @param on_bar An optional function to call with each completed Bar.
+    # @param keep If false completed bars are not added to their staffs.
+    # @param parts A list of the part ids to import, or None for all parts.
+    # @param bars A container of the bar ids to import, or None for all.
+    def __init__(self, on_bar=None, keep=True, parts=None, bars=None):
+        self.score = Score()
+        self.on_bar = on_bar
+        self.keep = keep
+        self.parts = parts
+        self.bars = bars
+        self.voice_ids = set()
+        self.voices_melodic = True
+        self.voices_static = True
+        self.staff_voices = {}
+        self.has_meta = False
+        self.part_names = {}
+        self.part = None
+        self.part_elem = None
+        self.staffs = {}
+        self.divisions = 1
+        self.count = 0
+        self.root = None
+
+    # Handles one iterparse() event.
+    # @param event Either 'start' or 'end'.
+    # @param elem The Element the event is for.
+    def handle(self, event, elem):
+        tag = elem.tag
+        if event == 'start':
+            if self.root is None:
+                if tag != 'score-partwise':
+                    raise ValueError(f"MusicXml: expected score-partwise but found '{tag}'.")
+                self.root = elem
+            elif tag == 'part':
+                self.start_part(elem)
+        elif tag == 'measure':
+            if self.part is not None:
+                self.end_measure(elem)
+            # Drop the consumed measure so the xml tree stays one measure deep.
+            elem.clear()
+            self.part_elem.remove(elem)
+        elif tag == 'part':
+            self.root.remove(elem)
+        elif tag == 'score-part':
+            self.part_names[elem.get('id')] = (elem.findtext('part-name'),
+                                               elem.findtext('part-abbreviation'))
+        elif tag == 'work':
+            self.set_metadata('work_title', elem.findtext('work-title'))
+            self.set_metadata('work_number', elem.findtext('work-number'))
+            self.has_meta = True
+        elif tag in ('movement-title', 'movement-number'):
+            self.set_metadata(tag.replace('-', '_'), elem.text)
+            self.has_meta = True
+        elif tag == 'identification':
+            for creator in elem.iter('creator'):
+                if creator.get('type') == 'composer':
+                    self.set_metadata('composer', creator.text)
+                self.has_meta = True
+            # Like MuseParse, each <rights> is added with a trailing space.
+            for rights in elem.iter('rights'):
+                if rights.text:
+                    metadata = self.score.metadata
+                    metadata['copyright'] = metadata.get('copyright', '') + rights.text.strip() + ' '
+                    self.has_meta = True
+
+    # Returns the imported Score.
+    def finish(self):
+        metadata = self.score.metadata
+        if not self.has_meta:
+            metadata['work_title'] = 'Untitled'
+        # Move the metadata import_score() sets after the titles to the end.
+        for key in ('main_key', 'main_meter'):
+            metadata[key] = metadata.pop(key, None)
+        metadata['voices_melodic'] = self.voices_melodic
+        metadata['voices_static'] = self.voices_static
+        metadata['voice_ids'] = [pid + "." + str(vid) for pid, vid in sorted(self.voice_ids)]
+        return self.score
+
+    # Sets a metadata value unless the value is empty.
+    def set_metadata(self, key, value):
+        if value:
+            self.score.metadata[key] = value.strip()
+
+    # Adds a new Part to the score at the start of a <part>, unless the
+    # part is not being imported.
+    def start_part(self, elem):
+        pid = elem.get('id')
+        self.part_elem = elem
+        if self.parts is not None and pid not in self.parts:
+            self.part = None
+            return
+        name, shortname = self.part_names.get(pid, (None, None))
+        self.part = Part(pid, name, shortname)
+        self.score.add_part(self.part)
+        self.staffs = {}
+        self.staff_voices = {}
+        self.divisions = 1
+        self.count = 0
+
+    # Returns the part's Staff with the given number, adding it to the
+    # part if it does not exist yet.
+    def get_staff(self, num):
+        staff = self.staffs.get(num)
+        if staff is None:
+            staff = self.staffs[num] = Staff(num)
+            self.part.add_staff(staff)
+        return staff
+
+    # Builds the Bars of a completed <measure>, one for each of the part's
+    # staffs, adds them to the staffs and passes them to on_bar. Measures
+    # outside the bars being imported only update the divisions.
+    # @param elem The <measure> element.
+    def end_measure(self, elem):
+        self.count += 1
+        number = elem.get('number', '0')
+        bid = int(number) if number.isdigit() else self.count
+        if self.bars is not None and bid not in self.bars:
+            for divisions in elem.iterfind('attributes/divisions'):
+                self.divisions = int(divisions.text)
+            return
+        partial = elem.get('implicit') == 'yes'
+        bars = {}
+        voices = {}
+        ends = {}
+        time = Ratio(0, 1)
+
+        def get_bar(num):
+            bar = bars.get(num)
+            if bar is None:
+                bar = bars[num] = Bar(bid, partial=partial, barline=Barline.STANDARD)
+            return bar
+
+        for num in self.staffs:
+            get_bar(num)
+        for child in elem:
+            tag = child.tag
+            if tag == 'note':
+                if child.find('grace') is not None:
+                    continue
+                length = Ratio(int(child.findtext('duration')), self.divisions * 4)
+                if child.find('cue') is not None:
+                    # Cue notes take up time, so a voice's next note is padded.
+                    if child.find('chord') is None:
+                        time = time + length
+                    continue
+                dur = xml_duration(child, length)
+                num = int(child.findtext('staff', '1'))
+                vid = int(child.findtext('voice', '1'))
+                voice = voices.get((num, vid))
+                if voice is None:
+                    voice = voices[(num, vid)] = Voice(vid)
+                    ends[(num, vid)] = Ratio(0, 1)
+                    get_bar(num)
+                if child.find('chord') is not None and voice.notes:
+                    add_chord_note(voice, xml_note(child, dur))
+                    self.voices_melodic = False
+                    continue
+                if ends[(num, vid)] < time:
+                    voice.add_note(Rest.pad(time - ends[(num, vid)]))
+                if child.find('rest') is not None:
+                    voice.add_note(Rest(dur))
+                else:
+                    voice.add_note(xml_note(child, dur))
+                time = time + length
+                ends[(num, vid)] = time
+            elif tag == 'backup':
+                time = time - Ratio(int(child.findtext('duration')), self.divisions * 4)
+            elif tag == 'forward':
+                time = time + Ratio(int(child.findtext('duration')), self.divisions * 4)
+            elif tag == 'attributes':
+                self.set_attributes(child, get_bar, bars)
+            elif tag == 'barline' and child.get('location', 'right') == 'right':
+                barline = xml_barline(child)
+                if barline is not None:
+                    for bar in bars.values():
+                        bar.barline = barline
+
+        pid = self.part.id
+        for (num, vid) in sorted(voices):
+            bars[num].add_voice(voices[(num, vid)])
+            self.voice_ids.add((pid, vid))
+        for num in sorted(bars):
+            self.check_static(num, [vid for (n, vid) in voices if n == num])
+            staff = self.get_staff(num)
+            bars[num].staff = staff
+            if self.keep:
+                staff.add_bar(bars[num])
+            if self.on_bar is not None:
+                self.on_bar(bars[num])
+
+    # Updates voices_static with the voice ids of one of a staff's bars. The
+    # voices are static while every bar of a staff has the same voice ids
+    # in the same order as the staff's first bar with voices.
+    # @param num The staff number.
+    # @param vids The list of the bar's voice ids, in the order the voices
+    # first appear in the measure.
+    def check_static(self, num, vids):
+        if not self.voices_static:
+            return
+        first = self.staff_voices.get(num)
+        if first:
+            self.voices_static = vids == first
+        else:
+            self.staff_voices[num] = vids
+
+    # Applies an <attributes> element to the measure's bars. Attributes
+    # with a number apply to that staff only, the others to every staff.
+    # A bar keeps the first clef, key and meter given to it in a measure.
+    # @param elem The <attributes> element.
+    # @param get_bar A function that returns the Bar for a staff number.
+    # @param bars The dictionary of the measure's bars by staff number.
+    def set_attributes(self, elem, get_bar, bars):
+        divisions = elem.findtext('divisions')
+        if divisions:
+            self.divisions = int(divisions)
+        staves = elem.findtext('staves')
+        if staves:
+            for num in range(1, int(staves) + 1):
+                get_bar(num)
+        if not bars:
+            get_bar(1)
+        metadata = self.score.metadata
+        for child in elem:
+            if child.tag == 'key':
+                value = xml_key(child)
+                metadata.setdefault('main_key', value)
+                attribute = 'key'
+            elif child.tag == 'time':
+                value = xml_meter(child)
+                metadata.setdefault('main_meter', value)
+                attribute = 'meter'
+            elif child.tag == 'clef':
+                value = xml_clef(child)
+                attribute = 'clef'
+            else:
+                continue
+            if value is None:
+                continue
+            if child.get('number'):
+                targets = [get_bar(int(child.get('number')))]
+            else:
+                targets = bars.values()
+            for bar in targets:
+                if getattr(bar, attribute) is None:
+                    setattr(bar, attribute, value)
+
+
+# Adds a note that sounds with the last note of a voice, turning that
+# note into a Chord if it is not one already.
+# @param voice The Voice.
+# @param note The Note to add.
+def add_chord_note(voice, note):
+    last = voice.notes[-1]
+    if isinstance(last, Chord):
+        last.notes.append(note)
+    elif isinstance(last, Note):
+        chord = Chord([last, note])
+        chord.voice = voice
+        voice.notes[-1] = chord
+
+
+# Returns the written duration of a <note> element, as import_score()
+# reads it: the value of its <type>, lengthened by its <dot>s and scaled
+# by its <time-modification>.
+# @param elem The <note> element.
+# @param length The Ratio of the note's <duration>, returned for notes
+# with no <type> or a <type> longer than a whole note.
+def xml_duration(elem, length):
+    denominator = XML_TYPES.get(elem.findtext('type'))
+    if denominator is None:
+        return length
+    dur = Ratio(1, denominator)
+    dots = len(elem.findall('dot'))
+    if dots:
+        dur = dur * 2 - dur * Ratio(1, 2 ** dots)
+    modification = elem.find('time-modification')
+    if modification is not None:
+        dur = dur * Ratio(int(modification.findtext('normal-notes')),
+                          int(modification.findtext('actual-notes')))
+    return dur
+
+
+# Returns a Note for a pitched <note> element.
+# @param elem The <note> element.
+# @param dur The Ratio duration of the note.
+def xml_note(elem, dur):
+    pitch = elem.find('pitch')
+    alter = int(float(pitch.findtext('alter', '0')))
+    name = pitch.findtext('step') + XML_ACCIDENTALS[alter] + pitch.findtext('octave')
+    return Note(Pitch(name), dur, xml_marks(elem))
+
+
+# Returns the list of Marks in a <note>'s <notations>.
+# @param elem The <note> element.
+def xml_marks(elem):
+    marks = []
+    for notations in elem.iterfind('notations'):
+        for child in notations.iter():
+            name = XML_MARKS.get(child.tag, child.tag.replace('-', '_').upper())
+            mark = Mark.__members__.get(name)
+            if mark is not None and mark not in marks:
+                marks.append(mark)
+    return marks
+
+
+# Returns the Key of a <key> element. Keys without a mode are major.
+# @param elem The <key> element.
+def xml_key(elem):
+    fifths = elem.findtext('fifths')
+    if fifths is None:
+        return None
+    mode = (elem.findtext('mode') or 'major').capitalize()
+    return Key(int(fifths), mode)
+
+
+# Returns the Meter of a <time> element, or None for senza misura and
+# additive meters.
+# @param elem The <time> element.
+def xml_meter(elem):
+    beats, beat_type = elem.findtext('beats'), elem.findtext('beat-type')
+    if not (beats and beats.isdigit() and beat_type and beat_type.isdigit()):
+        return None
+    return Meter(int(beats), int(beat_type))
+
+
+# Returns the Clef of a <clef> element, or None for clefs (percussion,
+# tablature) that have no Clef.
+# @param elem The <clef> element.
+def xml_clef(elem):
+    sign, line = elem.findtext('sign'), elem.findtext('line')
+    default = {'G': '2', 'F': '4', 'C': '3'}.get(sign)
+    name = XML_CLEFS.get((sign, int(line or default or 0)))
+    return Clef.__members__.get(name) if name else None
+
+
+# Returns the Barline of a right <barline> element, or None if the
+# barline has no style.
+# @param elem The <barline> element.
+def xml_barline(elem):
+    style = elem.findtext('bar-style')
+    repeat = elem.find('repeat')
+    direction = repeat.get('direction') if repeat is not None else None
+    name = XML_BARLINES.get((style, direction)) or XML_BARLINES.get((style, None))
+    if name is None and direction == 'backward':
+        name = 'RIGHT_REPEAT'
+    return Barline.__members__.get(name) if name else None
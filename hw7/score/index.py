@@ -0,0 +1,243 @@
+########################################
+
+## @file
+#  A byte offset index for loading a few measures of a large MusicXml file.
+#  A MeasureIndex records where every <part>, <measure> and <attributes>
+#  element of a partwise file starts and ends. It is built in one regular
+#  expression scan over a memory map of the file and saved next to it as a
+#  sidecar file (path + '.mindex'), which is rebuilt whenever the file's
+#  size or modification time changes.
+#
+#  import_measures() uses the index to import only the measures asked for:
+#  it copies them out of the memory mapped file into a small document and
+#  imports that with import_score_direct(). The divisions, staves, clefs,
+#  key and meter in effect before the first measure are read from the
+#  earlier <attributes> elements alone, and set on the first bar of each
+#  staff (unless the measure sets them itself), so the first bar always
+#  shows its clef, key and meter.
+#
+#  Example:
+#  @code
+#  hit = import_measures('mahler-2.musicxml', range(120, 124), parts=['P7'])
+#  @endcode
+
+import json
+import mmap
+import os
+import re
+from xml.etree import ElementTree
+
+from .direct import PART_ID, import_score_direct, xml_key, xml_meter, xml_clef
+
+__all__ = [
+    'import_measures',
+    'MeasureIndex'
+]
+
+# The version of the index file layout.
+INDEX_VERSION = 1
+
+# The tags the index scan finds: part and measure start tags (but not
+# <part-list>, <measure-style> etc.), their end tags, and <attributes>.
+INDEX_TAGS = re.compile(rb'<(/?)(part|measure)(?=[\s>])[^>]*>|<attributes(?=[\s>])[^>]*>.*?</attributes>',
+                        re.S)
+
+# The number attribute of a <measure> start tag.
+MEASURE_NUMBER = re.compile(rb'\bnumber\s*=\s*["\']([^"\']*)["\']')
+
+
+# Imports some of the measures of a partwise MusicXml file, using (and if
+# necessary building) the file's MeasureIndex.
+# @param path The path of an uncompressed MusicXml file.
+# @param bars A range (or any container) of the bar ids to import. Only
+# measures with numeric numbers can be selected.
+# @param parts A list of the part ids to import, or None for all parts.
+# @returns A Score with only the selected bars.
+def import_measures(path, bars, parts=None):
+    index = MeasureIndex.for_file(path)
+    with open(path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        chunks = [data[:index.header]]
+        states = {}
+        for part in index.parts:
+            if parts is not None and part['id'] not in parts:
+                continue
+            positions = [i for i, measure in enumerate(part['measures'])
+                         if measure[0].isdigit() and int(measure[0]) in bars]
+            if not positions:
+                continue
+            first = part['measures'][positions[0]]
+            last = part['measures'][positions[-1]]
+            state = attribute_state(data, part, positions[0])
+            states[part['id']] = state
+            seed = '<attributes><divisions>{}</divisions><staves>{}</staves></attributes>'
+            chunks.append(data[part['start']:part['tag_end']])
+            chunks.append(data[first[1]:first[2]])
+            chunks.append(seed.format(state['divisions'], state['staves']).encode())
+            chunks.append(data[first[2]:last[3]])
+            chunks.append(b'</part>')
+        chunks.append(b'</score-partwise>\n')
+    score = import_score_direct(b''.join(chunks), bars=bars)
+    for part in score:
+        state = states[part.id]
+        for staff in part:
+            if staff.bars:
+                seed_bar(staff.bars[0], state)
+    return score
+
+
+# Sets the clef, key and meter of a bar from an attribute state, unless
+# the bar has its own.
+# @param bar The first imported Bar of a staff.
+# @param state The attribute state, see attribute_state().
+def seed_bar(bar, state):
+    if bar.clef is None:
+        bar.clef = state['clefs'].get(bar.staff.id, state['clefs'].get(None))
+    if bar.key is None:
+        bar.key = state['key']
+    if bar.meter is None:
+        bar.meter = state['meter']
+
+
+# Returns the attributes in effect at the start of a measure, found by
+# reading the part's earlier <attributes> elements backwards.
+# @param data The file's bytes or memory map.
+# @param part The part's entry in a MeasureIndex.
+# @param position The position of the measure in the part.
+# @returns A dictionary of 'divisions', 'staves', 'key', 'meter' and
+# 'clefs' (a dictionary of staff number, or None for every staff, to Clef).
+def attribute_state(data, part, position):
+    state = {'divisions': None, 'staves': None, 'key': None, 'meter': None, 'clefs': {}}
+    for measure, start, end in reversed(part['attributes']):
+        if measure >= position:
+            continue
+        elem = ElementTree.fromstring(data[start:end])
+        for child in elem:
+            if child.tag == 'divisions' and state['divisions'] is None:
+                state['divisions'] = int(child.text)
+            elif child.tag == 'staves' and state['staves'] is None:
+                state['staves'] = int(child.text)
+            elif child.tag == 'key' and state['key'] is None:
+                state['key'] = xml_key(child)
+            elif child.tag == 'time' and state['meter'] is None:
+                state['meter'] = xml_meter(child)
+            elif child.tag == 'clef':
+                num = int(child.get('number')) if child.get('number') else None
+                if num not in state['clefs'] and None not in state['clefs']:
+                    state['clefs'][num] = xml_clef(child)
+        staves = state['staves'] or 1
+        if None not in state.values() and (None in state['clefs'] or len(state['clefs']) >= staves):
+            break
+    state['divisions'] = state['divisions'] or 1
+    state['staves'] = state['staves'] or 1
+    return state
+
+
+# The byte offsets of the parts, measures and attributes of a partwise
+# MusicXml file.
+class MeasureIndex:
+
+    # Initializes an empty MeasureIndex.
+    # @param size The size of the indexed file in bytes.
+    # @param mtime The modification time of the indexed file in ns.
+    def __init__(self, size=0, mtime=0):
+        self.size = size
+        self.mtime = mtime
+        # The offset of the first part: everything before it is the header.
+        self.header = 0
+        # A dictionary for each part: 'id', 'start', 'tag_end' (the end of
+        # its start tag), 'end', 'measures' (a list of [number, start,
+        # tag_end, end]) and 'attributes' (a list of [measure position,
+        # start, end]).
+        self.parts = []
+
+    # Returns a string showing the number of parts and measures and the
+    # hex id of the instance.
+    # Example: '<MeasureIndex: 2 parts 240 measures 0x10d4c1f90>'
+    def __str__(self):
+        return f'<MeasureIndex: {len(self.parts)} parts {self.num_measures()} measures {hex(id(self))}>'
+
+    # Define __repr__ to be the same as __str__ except there is
+    # no hex id included.
+    def __repr__(self):
+        return f'<MeasureIndex: {len(self.parts)} parts {self.num_measures()} measures>'
+
+    # Returns the total number of measures of all parts.
+    def num_measures(self):
+        return sum(len(part['measures']) for part in self.parts)
+
+    # Returns the index of a file, loaded from its sidecar file if that is
+    # up to date and otherwise built and saved.
+    # @param path The MusicXml file.
+    @classmethod
+    def for_file(cls, path):
+        index = cls.load(path)
+        if index is None:
+            index = cls.build(path)
+            index.save(index_path(path))
+        return index
+
+    # Builds the index of a file in one scan of its memory map.
+    # @param path The MusicXml file.
+    @classmethod
+    def build(cls, path):
+        stat = os.stat(path)
+        index = cls(stat.st_size, stat.st_mtime_ns)
+        with open(path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            part = measure = None
+            for match in INDEX_TAGS.finditer(data):
+                closing, tag = match.group(1), match.group(2)
+                if tag is None:
+                    if part is not None:
+                        part['attributes'].append([len(part['measures']) - 1, match.start(), match.end()])
+                elif tag == b'part' and not closing:
+                    pid = PART_ID.search(match.group())
+                    part = {'id': pid.group(1).decode() if pid else None, 'start': match.start(),
+                            'tag_end': match.end(), 'end': None, 'measures': [], 'attributes': []}
+                    if not index.parts:
+                        index.header = match.start()
+                    index.parts.append(part)
+                elif tag == b'part':
+                    part['end'] = match.end()
+                    part = None
+                elif not closing and part is not None:
+                    number = MEASURE_NUMBER.search(match.group())
+                    measure = [number.group(1).decode() if number else '', match.start(), match.end(), None]
+                    part['measures'].append(measure)
+                elif measure is not None:
+                    measure[3] = match.end()
+                    measure = None
+        return index
+
+    # Loads the index of a file from its sidecar file.
+    # @param path The MusicXml file.
+    # @returns The MeasureIndex, or None if there is no sidecar file or it
+    # is out of date.
+    @classmethod
+    def load(cls, path):
+        try:
+            with open(index_path(path)) as file:
+                fields = json.load(file)
+        except (OSError, ValueError):
+            return None
+        stat = os.stat(path)
+        if fields.get('version') != INDEX_VERSION or fields.get('size') != stat.st_size \
+                or fields.get('mtime') != stat.st_mtime_ns:
+            return None
+        index = cls(fields['size'], fields['mtime'])
+        index.header = fields['header']
+        index.parts = fields['parts']
+        return index
+
+    # Writes the index to a file.
+    # @param path The file path to write.
+    def save(self, path):
+        tmp = f'{path}.tmp{os.getpid()}'
+        with open(tmp, 'w') as file:
+            json.dump({'version': INDEX_VERSION, 'size': self.size, 'mtime': self.mtime,
+                       'header': self.header, 'parts': self.parts}, file)
+        os.replace(tmp, path)
+
+
+# Returns the path of the sidecar index file of a MusicXml file.
+def index_path(path):
+    return os.fspath(path) + '.mindex'
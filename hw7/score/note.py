@@ -14,14 +14,17 @@ class Note (Durational):
     # should call the Durational superclass' __init__() function
     # to set the dur attribute.
     # @param marks A list Marks for the note's marks attribute.
-    # Defaults to an empty list.
+    # Defaults to a new empty list.
     #
     # The attribute self.voice should be initialized to None.
     # See also: Rest, Chord, Durational, https://en.wikipedia.org/wiki/Musical_note
-    def __init__(self, pitch, dur, marks=[]):
+    def __init__(self, pitch, dur, marks=None):
         # call super constructor
         super().__init__(dur)
 
+        if marks is None:
+            marks = []
+
         # set pitch
         if isinstance(pitch, Pitch):
             self.pitch = pitch
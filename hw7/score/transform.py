@@ -0,0 +1,331 @@
+########################################
+
+## @file
+#  Copy-on-write transformations of a Score.
+#  Each transformation returns a new Score that shares every Bar, Voice,
+#  Note, Rest and Chord the transformation leaves alone with the source
+#  score, and only copies the objects it actually changes (plus the
+#  Score/Part/Staff containers above them). A transposition of a piano
+#  score with many empty bars, for example, shares all of the all-rest
+#  voices with the original. Shared objects keep their back references
+#  (note.voice, voice.bar) to the source score, exactly like a ScoreView,
+#  so a derived score should be treated as read-only.
+#
+#  Example:
+#  @code
+#  variants = [bach.transposed(n) for n in range(-5, 7)]
+#  slow = bach.scaled(Ratio(2, 1))
+#  @endcode
+
+from .ratio import Ratio
+from .pitch import Pitch
+from .interval import Interval
+from .key import Key
+from .meter import Meter
+from .note import Note
+from .rest import Rest
+from .chord import Chord
+from .voice import Voice
+from .bar import Bar
+from .staff import Staff
+from .part import Part
+from .score import Score
+
+__all__ = [
+    'transposed',
+    'scaled',
+    'retrograde',
+    'inverted',
+    'derive'
+]
+
+
+# The positions of the letters C D E F G A B on the line of fifths,
+# counting from C = 0.
+FIFTHS = [0, 2, 4, -1, 1, 3, 5]
+
+# The letters of the line of fifths starting at F.
+FIFTH_LETTERS = [3, 0, 4, 1, 5, 2, 6]
+
+# The pitch classes of the natural letters C D E F G A B.
+NATURALS = [0, 2, 4, 5, 7, 9, 11]
+
+# The mode a key's mode becomes when its scale is inverted.
+INVERTED_MODES = {'Major': 'Phrygian', 'Phrygian': 'Major',
+                  'Lydian': 'Locrian', 'Locrian': 'Lydian',
+                  'Mixolydian': 'Minor', 'Minor': 'Mixolydian',
+                  'Dorian': 'Dorian'}
+
+
+# Returns a copy of the score transposed by an interval. Pitches are
+# respelled and key signatures moved so that the result reads like a
+# transposition by hand.
+# @param score The Score to transpose.
+# @param interval An Interval, or an integer number of semitones. Integer
+# transpositions move key signatures by at most six sharps or flats, and
+# spell keys and notes alike (see integer_shift()).
+#
+# Rests, and voices and bars without notes, are shared with the source.
+# The method raises a ValueError if a transposed key or pitch does not
+# exist, e.g. transposing C#-Major up a minor second by Interval.
+def transposed(score, interval):
+    if isinstance(interval, Interval):
+        shift = line_of_fifths(interval.transpose(Pitch('C4')))
+        semitones = interval.semitones()
+    elif isinstance(interval, int):
+        semitones = interval
+        shift = integer_shift(score, semitones)
+    else:
+        raise TypeError("interval must be an Interval or an integer")
+    keys = {}
+
+    def key_fn(key):
+        return shared_key(keys, key.signum + shift, key.mode)
+
+    def pitch_fn(pitch):
+        return spell(line_of_fifths(pitch) + shift, pitch.keynum() + semitones)
+
+    return derive(score, pitch_fn=pitch_fn, key_fn=key_fn)
+
+
+# Returns a copy of the score with every duration multiplied by a factor
+# (augmentation if the factor is greater than one, diminution if less).
+# Meters are scaled to match: 3/4 scaled by 2 becomes 3/2, and 3/4 scaled
+# by 3/2 becomes 9/8.
+# @param score The Score to scale.
+# @param factor A positive Ratio or integer.
+#
+# The method raises a ValueError if a scaled meter does not exist.
+def scaled(score, factor):
+    if isinstance(factor, int):
+        factor = Ratio(factor, 1)
+    if not isinstance(factor, Ratio):
+        raise TypeError("factor must be a Ratio or an integer")
+    if factor <= Ratio(0, 1):
+        raise ValueError("factor must be positive")
+    meters = {}
+
+    def meter_fn(meter):
+        num, den = meter.num, meter.den * factor.den
+        if den % factor.num == 0:
+            den //= factor.num
+        else:
+            num *= factor.num
+        if (num, den) not in meters:
+            meters[(num, den)] = Meter(num, den)
+        return meters[(num, den)]
+
+    def dur_fn(dur):
+        return dur * factor
+
+    return derive(score, dur_fn=dur_fn, meter_fn=meter_fn)
+
+
+# Returns a copy of the score played backwards: the bars of every staff
+# are in reverse order and the notes of every voice are reversed. Bars
+# are renumbered so that bar ids still ascend. The clef, key and meter in
+# effect at the end of a staff open the reversed staff, and the final
+# barline still ends it. See reversed_settings().
+# @param score The Score to reverse.
+#
+# Voices of a single note or rest are shared with the source.
+def retrograde(score):
+    return derive(score, reverse=True)
+
+
+# Returns a copy of the score with its pitches mirrored around an axis,
+# so that every interval above the axis is replaced by the same interval
+# below it. Key signatures are mirrored as well, e.g. C-Major inverted
+# around C4 becomes C-Phrygian (four flats).
+# @param score The Score to invert.
+# @param axis The Pitch to invert around.
+#
+# The method raises a ValueError if an inverted key or pitch does not
+# exist.
+def inverted(score, axis):
+    if not isinstance(axis, Pitch):
+        raise TypeError("axis must be a Pitch")
+    center = line_of_fifths(axis) * 2
+    keys = {}
+
+    def key_fn(key):
+        mode = getattr(key.mode, 'name', key.mode).capitalize()
+        return shared_key(keys, center - key.signum - 4, INVERTED_MODES.get(mode, key.mode))
+
+    def pitch_fn(pitch):
+        return spell(center - line_of_fifths(pitch), axis.keynum() * 2 - pitch.keynum())
+
+    return derive(score, pitch_fn=pitch_fn, key_fn=key_fn)
+
+
+# Returns a new score built from the source score by applying the
+# given functions to its objects. Objects that no function changes are
+# shared with the source rather than copied.
+# @param score The source Score.
+# @param pitch_fn A function from a note's Pitch to its new Pitch.
+# @param dur_fn A function from a Durational's Ratio duration to its new
+# duration.
+# @param key_fn A function from a bar's Key to its new Key.
+# @param meter_fn A function from a bar's Meter to its new Meter.
+# @param reverse If true bars and the notes in voices are reversed.
+def derive(score, pitch_fn=None, dur_fn=None, key_fn=None, meter_fn=None, reverse=False):
+    def note_fn(note):
+        if isinstance(note, Chord):
+            notes = [note_fn(n) for n in note.notes]
+            if all(new is old for new, old in zip(notes, note.notes)):
+                return note
+            return Chord(notes)
+        dur = dur_fn(note.dur) if dur_fn else note.dur
+        if isinstance(note, Rest):
+            if dur_fn is None:
+                return note
+            return Rest.pad(dur) if note.is_pad() else Rest(dur)
+        if pitch_fn is None and dur_fn is None:
+            return note
+        pitch = pitch_fn(note.pitch) if pitch_fn else note.pitch
+        return Note(pitch, dur, list(note.marks))
+
+    def voice_fn(voice):
+        notes = [note_fn(n) for n in voice]
+        if reverse:
+            notes.reverse()
+        if all(new is old for new, old in zip(notes, voice.notes)):
+            return voice
+        copy = Voice(voice.id)
+        shared = {id(note) for note in voice.notes}
+        for note in notes:
+            if id(note) in shared:
+                copy.add_shared_note(note)
+            else:
+                copy.add_note(note)
+        return copy
+
+    def bar_fn(bar, bid, clef, key, meter, barline):
+        voices = [voice_fn(v) for v in bar]
+        key = key_fn(key) if key_fn and key is not None else key
+        meter = meter_fn(meter) if meter_fn and meter is not None else meter
+        if bid == bar.id and clef is bar.clef and key is bar.key and meter is bar.meter \
+                and barline is bar.barline and all(new is old for new, old in zip(voices, bar.voices)):
+            return bar
+        copy = Bar(bid, clef, key, meter, barline, bar.partial)
+        for voice in voices:
+            if voice in bar.voices:
+                copy.voices.append(voice)
+            else:
+                copy.add_voice(voice)
+        return copy
+
+    metadata = dict(score.metadata)
+    if key_fn and isinstance(metadata.get('main_key'), Key):
+        metadata['main_key'] = key_fn(metadata['main_key'])
+    if meter_fn and isinstance(metadata.get('main_meter'), Meter):
+        metadata['main_meter'] = meter_fn(metadata['main_meter'])
+    result = Score(metadata)
+    for part in score:
+        part_copy = Part(part.id, part.name, part.shortname)
+        for staff in part:
+            staff_copy = Staff(staff.id)
+            staff_copy.num = staff.num
+            if reverse:
+                bars = staff.bars[::-1]
+                settings = reversed_settings(staff.bars)
+            else:
+                bars = staff.bars
+                settings = [(bar.clef, bar.key, bar.meter, bar.barline) for bar in bars]
+            for bar, bid, setting in zip(bars, staff.bar_ids(), settings):
+                bar_copy = bar_fn(bar, bid, *setting)
+                if bar_copy is not bar:
+                    bar_copy.staff = staff_copy
+                staff_copy.add_bar(bar_copy)
+            part_copy.add_staff(staff_copy)
+        result.add_part(part_copy)
+    return result
+
+
+# Returns the clef, key, meter and barline of each bar of a staff played
+# backwards, last bar first. The reversed staff opens with the clef, key
+# and meter in effect at the end of the staff. A change at the start of a
+# bar moves to the start of the bar before it, where the old setting now
+# begins. Each barline moves to the end of the bar after it, except the
+# final barline, which still ends the staff.
+# @param bars The staff's bars in their original order.
+# @returns A list of (clef, key, meter, barline) tuples in reversed order.
+def reversed_settings(bars):
+    states = []
+    state = (None, None, None)
+    for bar in bars:
+        changes = (bar.clef, bar.key, bar.meter)
+        state = tuple(new if new is not None else old for new, old in zip(changes, state))
+        states.append(state)
+    last = len(bars) - 1
+    settings = []
+    for i in range(last, -1, -1):
+        if i == last:
+            clef, key, meter = states[i]
+        else:
+            following = bars[i + 1]
+            changes = (following.clef, following.key, following.meter)
+            clef, key, meter = (old if new is not None else None for new, old in zip(changes, states[i]))
+        barline = bars[last].barline if i == 0 else bars[i - 1].barline
+        settings.append((clef, key, meter, barline))
+    return settings
+
+
+# Returns the line of fifths shift of a transposition by a number of
+# semitones. Of the two enharmonic shifts (e.g. up a semitone is 7 fifths
+# up, C to C#, or 5 down, C to Db) it returns the one within six fifths,
+# unless that would take one of the score's keys past seven sharps or
+# flats and the other would not. If neither fits every key, the score's
+# first key decides.
+# @param score The Score being transposed.
+# @param semitones The integer transposition.
+def integer_shift(score, semitones):
+    shift = (semitones * 7 + 6) % 12 - 6
+    other = shift - 12 if shift > 0 else shift + 12
+    keys = score_keys(score)
+    for candidate in (shift, other):
+        if all(-7 <= key.signum + candidate <= 7 for key in keys):
+            return candidate
+    return shift if -7 <= keys[0].signum + shift <= 7 else other
+
+
+# Returns a list of the score's main key (if it has one) and the key of
+# every bar that has one.
+def score_keys(score):
+    keys = [score.metadata['main_key']] if isinstance(score.metadata.get('main_key'), Key) else []
+    for part in score:
+        for staff in part:
+            keys.extend(bar.key for bar in staff if bar.key is not None)
+    return keys
+
+
+# Returns the position of a pitch's letter and accidental on the line of
+# fifths, counting from C = 0: F is -1, G is 1, F# is 6, Bb is -2.
+# @param pitch The Pitch.
+def line_of_fifths(pitch):
+    return FIFTHS[pitch.letter] + (pitch.accidental - 2) * 7
+
+
+# Returns the Pitch with the given line of fifths position and key
+# number, or a default spelling of the key number if that position
+# would need more than two sharps or flats.
+# @param fifths The line of fifths position. See: line_of_fifths().
+# @param keynum The midi key number of the pitch.
+def spell(fifths, keynum):
+    letter = FIFTH_LETTERS[(fifths + 1) % 7]
+    accidental = (fifths + 1) // 7 + 2
+    if not 0 <= accidental <= 4:
+        return Pitch.from_keynum(keynum)
+    octave = (keynum - NATURALS[letter] - (accidental - 2)) // 12
+    return Pitch([letter, accidental, octave])
+
+
+# Returns a Key with the given signum and mode, reusing the Key made for
+# the same signum and mode earlier in the same transformation.
+# @param keys The dictionary of keys made so far.
+# @param signum The key's number of sharps (positive) or flats (negative).
+# @param mode The key's mode.
+def shared_key(keys, signum, mode):
+    if (signum, mode) not in keys:
+        keys[(signum, mode)] = Key(signum, mode)
+    return keys[(signum, mode)]
@@ -0,0 +1,161 @@
+########################################
+
+## @file
+#  Lightweight views onto a subset of a Score.
+#  A view selects parts, bars and voices of a score without copying them:
+#  it holds new Part/Staff/Bar level containers whose lists refer to the
+#  original Bar, Voice, Note, Rest and Chord objects. Views iterate exactly
+#  like the score classes they stand in for, and a ScoreView is a Score, so
+#  timepoints(), analyses and every Score method can be run on a window of
+#  a score. Since the underlying objects are shared, changing a note in a
+#  view changes it in the score too.
+#
+#  Example:
+#  @code
+#  window = score.view(parts=['P1'], bars=range(10, 21))
+#  for part in window:
+#      for staff in part:
+#          for bar in staff:
+#              pass
+#  @endcode
+
+from .ratio import Ratio
+from .score import Score
+
+__all__ = [
+    'ScoreView',
+    'PartView',
+    'StaffView',
+    'BarView'
+]
+
+
+# A Score whose parts are PartViews of another score. See: Score.view().
+class ScoreView(Score):
+
+    # Initializes a view of a score.
+    # @param score The Score (or ScoreView) to view.
+    # @param parts A list of part ids to include, or None for all parts.
+    # @param bars A range (or any container) of bar ids to include, or
+    # None for all bars.
+    # @param voices A list of voice ids to include, or None for all voices.
+    def __init__(self, score, parts=None, bars=None, voices=None):
+        views = [PartView(part, bars, voices) for part in score
+                 if parts is None or part.id in parts]
+        super().__init__(score.metadata, views)
+        self.source = score
+
+    # Returns a string showing the score's title and the hex id of the
+    # instance.
+    # Example: '<ScoreView: "Aus meines Herzens Grunde" 0x103fa5780>'
+    def __str__(self):
+        work_title = self.metadata.get('work_title', '(untitled)')
+        return f'<ScoreView: "{work_title}" {hex(id(self))}>'
+
+    # Views do not own their parts, so parts cannot be added to them.
+    def add_part(self, part):
+        raise TypeError("can't add parts to a ScoreView")
+
+
+# A view of a Part holding StaffViews of the part's staffs.
+class PartView:
+
+    # Initializes a view of a part.
+    # @param part The Part to view.
+    # @param bars A container of bar ids to include, or None for all bars.
+    # @param voices A list of voice ids to include, or None for all voices.
+    def __init__(self, part, bars=None, voices=None):
+        self.part = part
+        self.staffs = [StaffView(staff, bars, voices) for staff in part]
+
+    # Returns attributes such as id, name and shortname from the part.
+    def __getattr__(self, name):
+        return getattr(self.part, name)
+
+    def __str__(self):
+        return str(self.part)
+
+    def __repr__(self):
+        return repr(self.part)
+
+    def __iter__(self):
+        return iter(self.staffs)
+
+    def staff_ids(self):
+        return [staff.id for staff in self.staffs]
+
+    def num_staffs(self):
+        return len(self.staffs)
+
+
+# A view of a Staff holding the selected bars of the staff. Bars are the
+# staff's own Bar objects unless voices are filtered, in which case they
+# are BarViews.
+class StaffView:
+
+    # Initializes a view of a staff.
+    # @param staff The Staff to view.
+    # @param bars A container of bar ids to include, or None for all bars.
+    # @param voices A list of voice ids to include, or None for all voices.
+    def __init__(self, staff, bars=None, voices=None):
+        self.staff = staff
+        self.bars = [bar if voices is None else BarView(bar, voices)
+                     for bar in staff if bars is None or bar.id in bars]
+
+    # Returns attributes such as id and part from the staff.
+    def __getattr__(self, name):
+        return getattr(self.staff, name)
+
+    def __str__(self):
+        return str(self.staff)
+
+    def __repr__(self):
+        return repr(self.staff)
+
+    def __iter__(self):
+        return iter(self.bars)
+
+    def bar_ids(self):
+        return [bar.id for bar in self.bars]
+
+    def num_bars(self):
+        return len(self.bars)
+
+
+# A view of a Bar holding only the selected voices of the bar.
+class BarView:
+
+    # Initializes a view of a bar.
+    # @param bar The Bar to view.
+    # @param voices A list of voice ids to include.
+    def __init__(self, bar, voices):
+        self.bar = bar
+        self.voices = [voice for voice in bar if voice.id in voices]
+
+    # Returns attributes such as id, clef, key, meter, barline, partial
+    # and staff from the bar.
+    def __getattr__(self, name):
+        return getattr(self.bar, name)
+
+    def __str__(self):
+        return str(self.bar)
+
+    def __repr__(self):
+        return repr(self.bar)
+
+    def __iter__(self):
+        return iter(self.voices)
+
+    def voice_ids(self):
+        return [voice.id for voice in self.voices]
+
+    def num_voices(self):
+        return len(self.voices)
+
+    # Returns the duration of the longest selected voice. See: Bar.dur().
+    def dur(self):
+        total = Ratio(0, 1)
+        for voice in self.voices:
+            if voice.total > total:
+                total = voice.total
+        return total
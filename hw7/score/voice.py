@@ -1,5 +1,6 @@
 ########################################
 
+from bisect import bisect_left, bisect_right
 from .ratio import Ratio
 from .durational import Durational
 
@@ -14,11 +15,17 @@ class Voice:
     #
     # The attribute self.notes should be initialized to an empty list and
     # self.bar to None.  See also: Note, Rest, Chord, Bar.
+    #
+    # The voice also keeps self.onsets, a list holding the start time of
+    # each note measured from the start of the bar, and self.total, the
+    # Ratio end time of the last note. Both are updated by add_note().
     def __init__(self, voiceid):
         if isinstance(voiceid, int):
             self.id = voiceid
             self.notes = []
             self.bar = None
+            self.onsets = []
+            self.total = Ratio(0, 1)
         else:
             raise TypeError("voiceid must be an integer")
 
@@ -45,19 +52,52 @@ class Voice:
     #
     # The method should raise a TypeError if object supplied is not a Durational.
     def add_note(self, note):
+        self.add_shared_note(note)
+        note.voice = self
+
+    # Appends a Note, Chord or Rest that belongs to another voice to the
+    # voice's note list, leaving the object's voice attribute alone. Derived
+    # scores use this to share unchanged notes with their source.
+    # @param note The note, chord, or rest to append to the note list.
+    #
+    # The method should raise a TypeError if object supplied is not a Durational.
+    def add_shared_note(self, note):
         if isinstance(note, Durational):
-            note.voice = self
             self.notes.append(note)
+            self.onsets.append(self.total)
+            self.total = self.total + note.dur
         else:
             raise TypeError("can only add Durationals to voices")
 
     # Returns a beat Ratio representing the total duration of the notes
     # in the voice.
     def dur(self):
-        total_dur = Ratio(0, 1)
-        for note in self.notes:
-            total_dur += note.dur
-        return total_dur
+        return self.total
+
+    # Returns the Ratio start time of the note at the given index, measured
+    # from the start of the bar.
+    # @param index The index of the note in the voice's note list.
+    def onset(self, index):
+        return self.onsets[index]
+
+    # Returns the Note, Chord or Rest sounding at the given time, or None
+    # if the time is outside the voice. The search is a bisection of the
+    # voice's onsets.
+    # @param time A Ratio time measured from the start of the bar.
+    def note_at(self, time):
+        index = bisect_right(self.onsets, time) - 1
+        if index >= 0 and time < self.total:
+            return self.notes[index]
+        return None
+
+    # Returns the list of Notes, Chords and Rests whose onsets lie in
+    # the half open time span [start, end).
+    # @param start A Ratio time measured from the start of the bar.
+    # @param end A Ratio time measured from the start of the bar.
+    def notes_between(self, start, end):
+        i = bisect_left(self.onsets, start)
+        j = bisect_left(self.onsets, end)
+        return self.notes[i:j]
 
     # Returns the 'part and voice' identifier of the voice, a string
     # concatenation of the part's id with the voice's id: PARTID.VOICEID
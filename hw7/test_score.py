@@ -0,0 +1,68 @@
+########################################
+
+## @file
+#  Tests of the score importers. Run from the repository root:
+#  @code
+#  python -m unittest hw7.test_score
+#  @endcode
+
+import os
+import tempfile
+import unittest
+
+from hw7 import score as S
+from hw7.score.direct import merge_metadata
+
+
+# Returns a partwise MusicXml document with one bar of two voices in each
+# of its parts.
+# @param count The number of parts, P1 to P<count>.
+def many_parts_xml(count):
+    pids = ['P' + str(i) for i in range(1, count + 1)]
+    lines = ['<?xml version="1.0"?>', '<score-partwise><part-list>']
+    lines += [f'<score-part id="{pid}"><part-name>{pid}</part-name></score-part>' for pid in pids]
+    lines.append('</part-list>')
+    for pid in pids:
+        lines.append(f'<part id="{pid}"><measure number="1">'
+                     '<attributes><divisions>1</divisions><time><beats>4</beats><beat-type>4</beat-type></time>'
+                     '<clef><sign>G</sign><line>2</line></clef></attributes>')
+        for vid in (1, 2):
+            lines.append(f'<note><pitch><step>C</step><octave>{3 + vid}</octave></pitch><duration>4</duration>'
+                         f'<voice>{vid}</voice><type>whole</type></note>')
+            if vid == 1:
+                lines.append('<backup><duration>4</duration></backup>')
+        lines.append('</measure></part>')
+    lines.append('</score-partwise>')
+    return '\n'.join(lines)
+
+
+class TestParallelImport(unittest.TestCase):
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.xml')
+        with os.fdopen(handle, 'w') as file:
+            file.write(many_parts_xml(12))
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_voice_ids_match_direct_import(self):
+        direct = S.import_score_direct(self.path)
+        parallel = S.import_score_parallel(self.path, workers=1)
+        self.assertEqual(parallel.metadata['voice_ids'], direct.metadata['voice_ids'])
+        self.assertEqual(direct.metadata['voice_ids'][:6], ['P1.1', 'P1.2', 'P10.1', 'P10.2', 'P11.1', 'P11.2'])
+        self.assertEqual(len(direct.metadata['voice_ids']), 24)
+
+    def test_parts_keep_file_order(self):
+        parallel = S.import_score_parallel(self.path, workers=1)
+        self.assertEqual([part.id for part in parallel], ['P' + str(i) for i in range(1, 13)])
+
+    def test_merge_sorts_voice_numbers(self):
+        metadata = {'voices_melodic': True, 'voices_static': True, 'voice_ids': ['P1.2', 'P1.10']}
+        merge_metadata(metadata, {'voices_melodic': True, 'voices_static': False, 'voice_ids': ['P1.1', 'P1.2']})
+        self.assertEqual(metadata['voice_ids'], ['P1.1', 'P1.2', 'P1.10'])
+        self.assertFalse(metadata['voices_static'])
+
+
+if __name__ == '__main__':
+    unittest.main()